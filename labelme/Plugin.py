@@ -3,9 +3,27 @@ from PyQt5.QtGui import *
 from PyQt5.uic import loadUi
 from .label_dialog import *
 from .tool_bar import *
+from . import json_codec
+from . import raster_stats
+from .raster_cache import rasterInfo
+from .raster_cache import rasterMeta
+from . import gdal_pool
+from .gdal_profile import gdalProfile
+from . import gdal_profile
+from . import raster_cache
 from .label_file import *
+from .label_store import *
+from .label_journal import *
+from .save_thread import SaveThread
+from .prefetch_thread import PrefetchThread
+from .meta_thread import MetaThread
+from .dir_scanner import *
+from .dir_watcher import DirWatcher
+from .dir_watcher import snapshotFiles
+from .file_list_model import FileListModel
+from .scan_cache import ScanCache
 from .labelme2COCO import *
-from .label_qlist_widget import *
+from .label_list_model import LabelListModel
 from .escapable_qlist_widget import *
 from .utils import struct
 from .utils import addActions
@@ -13,6 +31,7 @@ from .utils import fmtShortcut
 from .utils import newAction
 from .utils import newIcon
 from .color_dialog import *
+import collections
 import webbrowser
 import glob 
 import shutil
@@ -54,6 +73,15 @@ class LabelmePlugin:
         self.fileInfo_dock.setVisible(False)
         config = get_config()
         self._config = config
+        json_codec.setCompact(self._config['compact_json'])
+        statistics = self._config['statistics']
+        raster_stats.setMode(statistics['mode'], statistics['low_percent'],
+                             statistics['high_percent'])
+        raster_cache.setMaxBytes(
+            int(self._config['raster_cache_mb'] * 1024 * 1024))
+        # the export and tiling presets take over for the time of a job
+        gdal_profile.setProfiles(self._config['gdal'])
+        gdal_profile.applyProfile('interactive')
         self.colorDialog = ColorDialog(parent=self.mainWnd)
         self.grid_color = None
         self.grid_size = None 
@@ -64,10 +92,34 @@ class LabelmePlugin:
         self.filename = None
         self.output_file = None
         self.output_dir = None
-        self.supportedFmts = ['img','tif','tiff','png', 'jpg', 'ecw', 'gta', 'pix']
+        self.supportedFmts = list(imageExtensions)
         self._noSelectionSlot = False
         self.imageWidth = 0
         self.imageHeight = 0
+        self.labelStore = JsonLabelStore()
+        # auto save edit journal, see journalEdits
+        self.journal = None
+        # id -> (shape, journal id), numbered on first use, see journalIds
+        self._shapeIds = {}
+        # the shapes of the label file until they are numbered
+        self._fileShapes = None
+        # id -> (shape, the json keys of its file shape beyond formatShape)
+        self._shapeOther = {}
+        # id -> shape added, changed or deleted since the last journalEdits
+        self._dirtyShapes = {}
+        # a change that touched every shape (or their order)
+        self._journalAll = False
+        self._journalMeta = None
+        self._nextShapeId = 0
+        # ids of the shapes in the label file on disk, in file order
+        self._fileIds = []
+        # whether LabelmeShape.thePoints can be assigned, see setShapePoints
+        self._bulkPoints = None
+        # background scan of the opened directory, see importDirImages
+        self.scanThread = None
+        self._noFileLoad = False
+        # keeps the file list up to date once scanned, see startDirWatcher
+        self.dirWatcher = None
 
 
 
@@ -117,6 +169,41 @@ class LabelmePlugin:
         self.lineColor = DEFAULT_LINE_COLOR 
         self.fillColor = DEFAULT_FILL_COLOR
         self.otherData = {} 
+
+        # auto save writes the edit journal, the label file itself is
+        # rewritten once the edits settle down
+        self.compactTimer = QtCore.QTimer()
+        self.compactTimer.setSingleShot(True)
+        self.compactTimer.setInterval(
+            int(self._config['auto_save_compact_interval'] * 1000))
+        self.compactTimer.timeout.connect(self.compactJournal)
+
+        # label files are written by a background thread, saveLabels only
+        # takes a snapshot of the shapes
+        self.saveThread = SaveThread()
+        self.saveThread.saved.connect(self.labelsSaved)
+        self.saveThread.failed.connect(self.labelsSaveFailed)
+        self.saveThread.start()
+
+        # the images next to the current one are read ahead, see
+        # schedulePrefetch
+        prefetch = self._config['prefetch']
+        self.prefetcher = PrefetchThread(
+            self.prefetchFile,
+            prefetch['next'] + prefetch['prev'],
+            int(prefetch['memory_mb'] * 1024 * 1024))
+        self.prefetcher.start()
+
+        # the size and georeferencing of the rows on screen, read from the
+        # image headers in the background
+        self.metaThread = MetaThread(rasterMeta)
+        self.metaThread.ready.connect(self.fileListModel.setMeta)
+        if self._config['file_list_metadata']:
+            self.fileListModel.metaRequest = self.metaThread.request
+        self.metaThread.start()
+
+        self.fsWatcher = QtCore.QFileSystemWatcher()
+        self.fsWatcher.directoryChanged.connect(self.directoryChanged)
        
         #set grid size
         self.grid_size = self.settings.value('grid_size')
@@ -135,15 +222,18 @@ class LabelmePlugin:
         self.statusBar().show()
       
     def fileSearchChanged(self):
-        self.importDirImages(
-            self.lastOpenDir,
-            pattern=self.fileSearch.text(),
-            load=False,
-        )
+        # filter once typing pauses, see applyFileSearch
+        self.fileSearchTimer.start()
+
+    def applyFileSearch(self):
+        self.fileListModel.setSearch(self.fileSearch.text())
+        row = self.imageList.find(self.filename) if self.filename else -1
+        if row >= 0:
+            self.setCurrentFileRow(row, load=False)
 
     # Message Dialogs. #
     def hasLabels(self):
-        if not self.labelList.itemsToShapes:
+        if not self.labelListModel.count():
             self.errorMessage(
                 'No objects labeled',
                 'You must label at least one object to save the file.')
@@ -169,32 +259,34 @@ class LabelmePlugin:
             return False
 
     def fileSelectionChanged(self):
-        items = self.fileListWidget.selectedItems()
-        if not items:
+        rows = self.fileListView.selectionModel().selectedRows()
+        if not rows or self._noFileLoad:
             return
-        item = items[0]
 
         if not self.mayContinue():
             return
 
-        if(self.shortName):
-            filename = self.short_long_name[str(item.text())]
-            currIndex = self.imageList.index(filename)
-        else:
-            currIndex = self.imageList.index(str(item.text()))
-
+        currIndex = rows[0].row()
         if currIndex < len(self.imageList):
             filename = self.imageList[currIndex]
             if filename:
                 self.loadFile(filename)
 
+    def setCurrentFileRow(self, row, load=True):
+        '''select the row of the file list, which loads its image.'''
+        index = self.fileListModel.index(row, 0)
+        self._noFileLoad = not load
+        try:
+            self.fileListView.setCurrentIndex(index)
+        finally:
+            self._noFileLoad = False
+        self.fileListView.scrollTo(index)
+
 
     def setDirty(self):
         if self._config['auto_save'] or self.actions.saveAuto.isChecked():
-            label_file = osp.splitext(self.imagePath)[0] + '.json'
-            if self.output_dir:
-                label_file = osp.join(self.output_dir, label_file)
-            self.saveLabels(label_file)
+            self.journalEdits(self.labelFilePath())
+            self.compactTimer.start()
             return
         self.dirty = True
         self.actions.save.setEnabled(True)
@@ -239,14 +331,18 @@ class LabelmePlugin:
             self.actions.undo.setEnabled(True)
             self.setDirty()
 
-    def  editLabel(self, item=None):
+    def  editLabel(self, index=None):
         print('*editLabel')
         if (not self.editor.isEditing()) and (not self.editor.canBreak()):
             print('*editLabel, not editing. return')
             return
-        item = item if item else self.currentItem()
-        shape = self.labelList.get_shape_from_item(item)
-        result = self.labelDialog.popUp(item.text(),shape.getProbability())
+        if isinstance(index, QModelIndex):
+            shape = self.labelListModel.shapeOf(index)
+        else:
+            shape = self.currentShape()
+        if shape is None:
+            return
+        result = self.labelDialog.popUp(shape.getLabel(),shape.getProbability())
         if result is None:
             return
         text , prob = result
@@ -255,15 +351,27 @@ class LabelmePlugin:
                               "Invalid label '{}' with validation type '{}'"
                               .format(text, self._config['validate_label']))
             return
-        item.setText(text)
+        if text != shape.getLabel():
+            shape.setLabel(text)
+            self.labelListModel.relabel(shape)
         shape.setProbability(prob)
+        self.markShapeDirty(shape)
         self.setDirty()
         if not self.uniqLabelList.findItems(text, Qt.MatchExactly):
             self.uniqLabelList.addItem(text)
             self.uniqLabelList.sortItems()
 
 
+    def addPointToEdge(self):
+        self.editor.addPointToEdge()
+        self.markShapeDirty(self.editor.selectedShape())
+
     # React to canvas signals.
+    def shapeMoved(self, *args):
+        '''the selected shape, or one of its vertices, was moved.'''
+        self.markShapeDirty(self.editor.selectedShape())
+        self.setDirty()
+
     def shapeSelectionChanged(self, selected=False):
         print('* shapeSelectionChanged slot triggered')
         if self._noSelectionSlot:
@@ -271,8 +379,7 @@ class LabelmePlugin:
         else:
             shape = self.editor.selectedShape()
             if shape:
-                item = self.labelList.get_item_from_shape(shape)
-                item.setSelected(True)
+                self.selectShapeRow(shape)
             else:
                 self.labelList.clearSelection()
         self.actions.delete.setEnabled(selected)
@@ -281,39 +388,88 @@ class LabelmePlugin:
         self.actions.shapeLineColor.setEnabled(selected)
         self.actions.shapeFillColor.setEnabled(selected)
 
+    def selectShapeRow(self, shape):
+        '''select the row of shape in the shape dock, its label row opened.'''
+        index = self.labelListModel.indexOf(shape)
+        if not index.isValid():
+            return
+        self.labelList.selectionModel().select(
+            index, QItemSelectionModel.ClearAndSelect)
+        self.labelList.scrollTo(index)
+
     def addLabel(self, shape):
-        item = QtWidgets.QListWidgetItem(shape.getLabel())
-        item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-        item.setCheckState(Qt.Checked)
-        self.labelList.itemsToShapes.append((item, shape))
-        self.labelList.addItem(item)
+        self.labelListModel.addShape(shape)
+        self.markShapeDirty(shape)
         if not self.uniqLabelList.findItems(shape.getLabel(), Qt.MatchExactly):
             self.uniqLabelList.addItem(shape.getLabel())
             self.uniqLabelList.sortItems()
-        self.labelDialog.addLabelHistory(item.text())
+        self.labelDialog.addLabelHistory(shape.getLabel())
         for action in self.actions.onShapesPresent:
             action.setEnabled(True)
 
     def noShapes(self):
-        return not self.labelList.itemsToShapes
+        return not self.labelListModel.count()
 
     def remLabel(self, shape):
-        item = self.labelList.get_item_from_shape(shape)
-        self.labelList.takeItem(self.labelList.row(item))
+        self.labelListModel.removeShape(shape)
+        self.markShapeDirty(shape)
 
     def loadShapes(self, shapes):
+        '''addLabel for a whole label file: the lists are updated and sorted once.'''
+        if not shapes:
+            self.editor.loadShapes(shapes)
+            return
+        labels = []
+        seen = set()
         for shape in shapes:
-            self.addLabel(shape)
+            label = shape.getLabel()
+            if label not in seen:
+                seen.add(label)
+                labels.append(label)
+        # the dock only renders the rows on screen
+        self.labelListModel.addShapes(shapes)
+        known = set(self.uniqLabelList.item(i).text()
+                    for i in range(self.uniqLabelList.count()))
+        new = [label for label in labels if label not in known]
+        if new:
+            self.uniqLabelList.addItems(new)
+            self.uniqLabelList.sortItems()
+        self.labelDialog.addLabelsHistory(labels)
+        for action in self.actions.onShapesPresent:
+            action.setEnabled(True)
         self.editor.loadShapes(shapes)
 
+    def setShapePoints(self, shape, points):
+        '''
+        give a new shape all its points: assigned in one go where the shape
+        allows it, one addPoint per point otherwise.
+        '''
+        qpoints = [QtCore.QPointF(x, y) for x, y in points]
+        if self._bulkPoints is not False:
+            try:
+                shape.thePoints = qpoints
+                ok = len(shape.thePoints) == len(qpoints)
+            except (AttributeError, TypeError):
+                ok = False
+            if ok:
+                self._bulkPoints = True
+                return
+            print('*bulk point assignment not supported, using addPoint')
+            self._bulkPoints = False
+        for p in qpoints:
+            shape.addPoint(p)
+
     def loadLabels(self, shapes):
+        '''create the shapes of a label file and return them, in file order.'''
         s = []
-        for label, points, line_color, fill_color, shape_type, probability in shapes:
+        for fileShape in shapes:
+            label, points, line_color, fill_color, shape_type, probability = fileShape
             shape = LabelmeShape(label, shape_type)
+            other = getattr(fileShape, 'other', None)
+            if other:
+                self._shapeOther[id(shape)] = (shape, other)
             shape.setProbability(probability)
-            for x, y in points:
-                print('*({},{})'.format(x,y))
-                shape.addPoint(QtCore.QPointF(x, y))
+            self.setShapePoints(shape, points)
             shape.close()
             s.append(shape)
             if line_color:
@@ -321,6 +477,7 @@ class LabelmePlugin:
             if fill_color:
                 shape.fill_color = QtGui.QColor(*fill_color)
         self.loadShapes(s)
+        return s
 
     #*
     def loadFlags(self, flags):
@@ -333,105 +490,433 @@ class LabelmePlugin:
             self.flag_widget.addItem(item)
 
 
-    # called by saveFile
-    def saveLabels(self, filename):
-        lf = LabelFile()
-        def format_shape(s):
-            print('*',len(s.thePoints))
-            return dict(
-                label= s.getLabel(),
-                line_color=s.line_color.getRgb()
-                if s.line_color != self.lineColor else None,
-                fill_color=s.fill_color.getRgb()
-                if s.fill_color != self.fillColor else None,
-                points=[(p.x(), p.y()) for p in s.thePoints],
-                probability = s.getProbability(),
-                shape_type=s.getType(),
-            )
+    def labelFilePath(self):
+        label_file = osp.splitext(self.imagePath)[0] + '.json'
+        if self.output_dir:
+            label_file = osp.join(self.output_dir, label_file)
+        return label_file
+
+    def formatShape(self, s):
+        entry = self._shapeOther.get(id(s))
+        return LabelFile.shapeDict(
+            label= s.getLabel(),
+            line_color=s.line_color.getRgb()
+            if s.line_color != self.lineColor else None,
+            fill_color=s.fill_color.getRgb()
+            if s.fill_color != self.fillColor else None,
+            points=[(p.x(), p.y()) for p in s.thePoints],
+            probability = s.getProbability(),
+            shape_type=s.getType(),
+            other=entry[1] if entry is not None else None,
+        )
 
-        shapes = [format_shape(shape) for shape in self.labelList.shapes]
+    def currentFlags(self):
         flags = {}
         for i in range(self.flag_widget.count()):
             item = self.flag_widget.item(i)
             key = item.text()
             flag = item.checkState() == Qt.Checked
             flags[key] = flag
+        return flags
+
+    # called by saveFile
+    def saveLabels(self, filename, wait=False):
+        '''
+        queue the current shapes for writing to filename; the outcome comes
+        back through labelsSaved / labelsSaveFailed. with wait the file is
+        written before returning, and False is returned if that failed.
+        '''
+        journal = None
+        if self.journal is not None and self.journal.isOpen() and \
+                self.journal.labelPath == filename:
+            # bring the journal up to date, so the snapshot matches it
+            journal = self.journal
+            self.journalEdits(filename)
+        elif filename == self.labelFilePath():
+            # the file gets every shape, nothing is left to journal
+            self._dirtyShapes = {}
+            self._journalAll = False
+        shapeIds = self.journalIds()
+        shapes = []
+        ids = []
+        for shape in self.labelListModel.shapes:
+            entry = shapeIds.get(id(shape))
+            if entry is None:
+                entry = (shape, self._nextShapeId)
+                self._nextShapeId += 1
+                shapeIds[id(shape)] = entry
+            shapes.append(self.formatShape(shape))
+            ids.append(entry[1])
+        token = dict(
+            ids=ids,
+            owner=self._shapeIds,
+            journal=journal,
+            seq=journal.count if journal is not None else None,
+            imagePath=self.imagePath,
+        )
         try:
             imagePath = osp.relpath(
                 self.imagePath, osp.dirname(filename))
             imageData = self.imageData if self._config['store_data'] else None
             if osp.dirname(filename) and not osp.exists(osp.dirname(filename)):
                 os.makedirs(osp.dirname(filename))
-            lf.save(
-                filename=filename,
-                shapes=shapes,
-                imagePath=imagePath,
-                imageData=imageData,
+        except Exception as e:
+            self.errorMessage('Error saving label data', '<b>%s</b>' % e)
+            return False
+        kwargs = dict(
+            shapes=shapes,
+            imagePath=imagePath,
+            imageData=imageData,
+            imageHeight=self.imageHeight,
+            imageWidth=self.imageWidth,
+            lineColor=self.lineColor.getRgb(),
+            fillColor=self.fillColor.getRgb(),
+            otherData=dict(self.otherData),
+            flags=self.currentFlags(),
+            binaryPoints=self._config['binary_points'],
+        )
+        print('* save label, imageWidth is {}'.format(self.imageWidth))
+        # a label file read ahead is outdated now
+        self.prefetcher.discard(self.imagePath)
+        if not wait:
+            self.saveThread.submit(filename, self.labelStore.save, kwargs, token)
+            return True
+        # keep the order of the writes to this file
+        self.saveThread.flush(filename)
+        try:
+            self.labelStore.save(filename=filename, **kwargs)
+        except LabelFileError as e:
+            self.labelsSaveFailed(filename, str(e), token)
+            return False
+        self.labelsSaved(filename, token)
+        return True
+
+    def labelsSaved(self, filename, token):
+        if token is None:
+            return
+        row = self.imageList.find(token['imagePath'])
+        if row >= 0:
+            self.fileListModel.setLabeled(row, True)
+        if filename == self.labelFilePath():
+            if self.labelFile is None:
+                self.labelFile = LabelFile()
+            self.labelFile.filename = filename
+            if token['owner'] is self._shapeIds:
+                self._fileIds = token['ids']
+        # the journal is not needed any more unless edits came in while
+        # the file was being written
+        journal = token['journal']
+        if journal is not None and (journal is self.journal or
+                                    self.journal is None or
+                                    self.journal.labelPath != filename):
+            # (a newer journal of the same file, opened after the file was
+            # reloaded, owns the journal file now)
+            if journal.count == token['seq']:
+                journal.discard()
+                if journal is self.journal:
+                    self.journal = None
+            elif journal.isOpen():
+                journal.rebase(token['ids'])
+
+    def labelsSaveFailed(self, filename, error, token):
+        self.errorMessage('Error saving label data', '<b>%s</b>' % error)
+        if token is not None and token['owner'] is self._shapeIds:
+            # the file does not hold the shapes the journal takes it for
+            self._journalAll = True
+        if filename == self.labelFilePath() and not self.dirty:
+            # let the user save again by hand
+            self.dirty = True
+            self.actions.save.setEnabled(True)
+
+    ####################################################################
+    #                          edit journal
+    ####################################################################
+    def resetJournal(self, shapes):
+        '''
+        the label file on disk holds `shapes` (in this order): drop the
+        journal. the shapes are only numbered when a journal or a save
+        needs them (journalIds), so opening an image costs nothing here.
+        '''
+        if self.journal is not None:
+            self.journal.discard()
+            self.journal = None
+        self._shapeIds = None
+        self._fileShapes = shapes
+        self._dirtyShapes = {}
+        self._journalAll = False
+        self._journalMeta = None
+
+    def journalIds(self):
+        '''id(shape) -> (shape, journal id), the label file's shapes first.'''
+        if self._shapeIds is None:
+            shapes = self._fileShapes or []
+            self._shapeIds = dict((id(shape), (shape, sid))
+                                  for sid, shape in enumerate(shapes))
+            self._fileIds = list(range(len(shapes)))
+            self._nextShapeId = len(shapes)
+            self._fileShapes = None
+        return self._shapeIds
+
+    def markShapeDirty(self, shape):
+        '''shape was added, changed or deleted: journal it on the next edit.'''
+        if shape is not None:
+            self._dirtyShapes[id(shape)] = shape
+
+    def journalEdits(self, label_file):
+        '''
+        append the edits since the last call to the journal: the shapes
+        marked by markShapeDirty, put or deleted as they are now. after a
+        change to every shape (journalAll: the default colors, shapes kept
+        from the previous image) all of them are put, with their order.
+        '''
+        if self.journal is None or self.journal.labelPath != label_file:
+            self.closeJournal()
+            self.journal = LabelJournal(label_file)
+        shapeIds = self.journalIds()
+        if not self.journal.isOpen():
+            self.journal.open(dict(
+                imagePath=osp.relpath(self.imagePath, osp.dirname(label_file)),
                 imageHeight=self.imageHeight,
                 imageWidth=self.imageWidth,
                 lineColor=self.lineColor.getRgb(),
                 fillColor=self.fillColor.getRgb(),
                 otherData=self.otherData,
-                flags=flags,
-            )
-            print('* save label, imageWidth is {}'.format(self.imageWidth))
-            self.labelFile = lf
-            items = self.fileListWidget.findItems(
-                self.imagePath, Qt.MatchExactly
-            )
-            if len(items) > 0:
-                if len(items) != 1:
-                    raise RuntimeError('There are duplicate files.')
-                items[0].setCheckState(Qt.Checked)
-            # disable allows next and previous image to proceed
-            # self.filename = filename
-            return True
-        except LabelFileError as e:
-            self.errorMessage('Error saving label data', '<b>%s</b>' % e)
+                flags=self.currentFlags(),
+            ), self._fileIds)
+        if self._journalAll:
+            dirty = collections.OrderedDict(
+                (key, shape) for key, (shape, _) in shapeIds.items())
+            dirty.update((id(shape), shape)
+                         for shape in self.labelListModel.shapes)
+            dirty.update(self._dirtyShapes)
+            dirty = list(dirty.values())
+        else:
+            # new shapes are appended to the list, in the order they came
+            dirty = list(self._dirtyShapes.values())
+        self._dirtyShapes = {}
+        for shape in dirty:
+            entry = shapeIds.get(id(shape))
+            if not self.labelListModel.contains(shape):
+                if entry is not None:
+                    self.journal.append('del', id=entry[1])
+                    del shapeIds[id(shape)]
+                continue
+            if entry is None:
+                entry = shapeIds[id(shape)] = (shape, self._nextShapeId)
+                self._nextShapeId += 1
+            self.journal.append('put', id=entry[1],
+                                shape=self.formatShape(shape))
+        if self._journalAll:
+            self.journal.append('order', ids=[
+                shapeIds[id(shape)][1]
+                for shape in self.labelListModel.shapes])
+            self._journalAll = False
+        meta = dict(
+            flags=self.currentFlags(),
+            lineColor=self.lineColor.getRgb(),
+            fillColor=self.fillColor.getRgb(),
+        )
+        if meta != self._journalMeta:
+            self.journal.append('meta', **meta)
+            self._journalMeta = meta
+
+    def compactJournal(self, wait=False):
+        '''rewrite the label file from the current shapes, dropping the journal.'''
+        self.compactTimer.stop()
+        if self.journal is None or not self.journal.isOpen():
+            return
+        self.saveLabels(self.journal.labelPath, wait)
+
+    def closeJournal(self):
+        '''stop journaling; a journal that could not be compacted stays on disk.'''
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def recoverJournal(self, label_file):
+        '''apply a journal left behind by a crash to self.labelFile.'''
+        journal = LabelJournal(label_file)
+        if not journal.exists():
             return False
+        try:
+            labelFile = journal.replay(self.labelFile)
+        except Exception as e:
+            print('*failed to replay journal', e)
+            labelFile = None
+        if labelFile is None:
+            journal.discard()
+            return False
+        self.labelFile = labelFile
+        return True
 
-
-    def importDirImages(self, dirpath, pattern=None, load=True):
+    def importDirImages(self, dirpath, load=True, select=None):
+        '''
+        fill the file list with the images below dirpath. the directory is
+        scanned in the background and the list fills up while it runs; once
+        done, select (or the first image) becomes the current file. a
+        directory opened before is shown from its scan cache right away and
+        the watcher catches up with what changed since (startDirWatcher).
+        '''
         self.actions.openNextImg.setEnabled(True)
         self.actions.openPrevImg.setEnabled(True)
 
         if not self.mayContinue() or not dirpath:
             return
 
+        self.stopScan()
+        self.stopDirWatcher()
+        self.prefetcher.clear()
+        self.metaThread.clear()
+        # let go of the images of the previous folder
+        gdal_pool.pool.clear()
         self.lastOpenDir = dirpath
+        self.openLabelStore(dirpath)
         self.filename = None
-        self.fileListWidget.clear()
-        self.short_long_name = {}
-        for filename in self.scanAllImages(dirpath):
-            if pattern and pattern not in filename:
-                continue
-            filename = filename.replace('\\','/')
-            label_file = osp.splitext(filename)[0] + '.json'
-            if self.output_dir:
-                label_file = osp.join(self.output_dir, label_file)
-            self.short_long_name[osp.basename(filename)] = filename
-            if(self.shortName):
-                item = QtWidgets.QListWidgetItem(osp.basename(filename))
-            else:
-                item = QtWidgets.QListWidgetItem(filename)
-            item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
-            if QtCore.QFile.exists(label_file) and \
-                    LabelFile.isLabelFile(label_file):
-                item.setCheckState(Qt.Checked)
-            else:
-                item.setCheckState(Qt.Unchecked)
-            self.fileListWidget.addItem(item)
-        self.openNextImg(load=load)
+        self.fileListModel.clear()
+        self.scanLoad = load
+        self.scanSelect = select
+        # the json backend tells labeled images from the scanned listing,
+        # otherwise ask the store
+        self.scanLabeled = None
+        if self.labelStore.name != 'json' or self.output_dir:
+            self.labelStore.refresh()
+            self.scanLabeled = set(self.labelStore.labelFiles())
+        if self._config['scan_cache']:
+            cache = ScanCache(dirpath)
+            snapshot = cache.load()
+            if snapshot is not None:
+                self.addScannedFiles(snapshotFiles(snapshot))
+                self.status('%s: %d 个图像' % (dirpath, len(self.imageList)))
+                self.scanFinished()
+                self.startDirWatcher(dirpath, snapshot)
+                return
+        self.scanThread = ScanThread(dirpath, self.supportedFmts)
+        self.scanThread.found.connect(
+            functools.partial(self.scanFound, self.scanThread))
+        self.scanThread.done.connect(
+            functools.partial(self.scanDone, self.scanThread))
+        self.status('扫描 %s ...' % dirpath)
+        self.scanThread.start()
+
+    def stopScan(self):
+        if self.scanThread is not None:
+            self.scanThread.stop()
+            self.scanThread = None
+
+    def scanFound(self, thread, entries):
+        '''a batch of (path, labeled) from the scan thread.'''
+        if thread is not self.scanThread:
+            return
+        self.addScannedFiles(entries)
+
+    def addScannedFiles(self, entries):
+        batch = []
+        for filename, labeled in entries:
+            if self.scanLabeled is not None:
+                label_file = osp.splitext(filename)[0] + '.json'
+                if self.output_dir:
+                    label_file = osp.join(self.output_dir, label_file)
+                labeled = label_file in self.scanLabeled
+            batch.append((filename, labeled))
+        # batches do not come in list order, the model keeps it sorted
+        self.fileListModel.addFiles(batch)
+
+    def scanDone(self, thread, count):
+        if thread is not self.scanThread:
+            return
+        self.scanThread = None
+        self.status('%s: %d 个图像' % (thread.root, count))
+        self.scanFinished()
+        # the listings of the scan are the watcher's snapshot
+        self.startDirWatcher(thread.root, thread.listings, unsaved=True)
+
+    def scanFinished(self):
+        row = self.imageList.find(self.scanSelect) if self.scanSelect else -1
+        if row >= 0:
+            # retain the current file
+            self.setCurrentFileRow(row)
+        elif self.filename is None:
+            self.openNextImg(load=self.scanLoad)
+
+    def startDirWatcher(self, dirpath, snapshot=None, unsaved=False):
+        '''
+        watch dirpath; snapshot is its listing (cached, or from the scan
+        when unsaved), already shown, that the watcher reconciles with the
+        disk.
+        '''
+        self.stopDirWatcher()
+        cache = ScanCache(dirpath) if self._config['scan_cache'] else None
+        self.dirWatcher = DirWatcher(dirpath, self.supportedFmts,
+                                     self._config['watch_poll_interval'],
+                                     snapshot, cache, unsaved)
+        self.dirWatcher.watch.connect(
+            functools.partial(self.watchDirs, self.dirWatcher))
+        self.dirWatcher.changed.connect(
+            functools.partial(self.filesChanged, self.dirWatcher))
+        self.dirWatcher.start()
+
+    def stopDirWatcher(self):
+        if self.dirWatcher is not None:
+            self.dirWatcher.stop()
+            self.dirWatcher = None
+        dirs = self.fsWatcher.directories()
+        if dirs:
+            self.fsWatcher.removePaths(dirs)
+
+    def watchDirs(self, watcher, dirs):
+        if watcher is not self.dirWatcher:
+            return
+        # keep clear of the OS limits, the poll covers the rest
+        room = DirWatcher.maxWatched - len(self.fsWatcher.directories())
+        if room > 0:
+            self.fsWatcher.addPaths(dirs[:room])
+
+    def directoryChanged(self, dirpath):
+        if self.dirWatcher is not None:
+            self.dirWatcher.poke(dirpath)
+
+    def filesChanged(self, watcher, added, removed, labeled):
+        '''apply what the directory watcher saw to the file list.'''
+        if watcher is not self.dirWatcher:
+            return
+        if self.scanLabeled is not None:
+            # the label files next to the images do not tell, ask the store
+            added = [(path, self.labelStore.exists(
+                osp.splitext(path)[0] + '.json')) for path, _ in added]
+            labeled = []
+        self.fileListModel.removeFiles(removed)
+        self.fileListModel.addFiles(added)
+        for path, value in labeled:
+            self.fileListModel.setLabeledPath(path, value)
+
+    def openLabelStore(self, dirpath):
+        '''switch the annotation backend to the dataset in dirpath.'''
+        if self.labelStore.root == dirpath:
+            return
+        self.saveThread.flush()
+        self.labelStore.close()
+        try:
+            self.labelStore = openLabelStore(
+                self._config['label_backend'], dirpath)
+        except Exception as e:
+            self.errorMessage('打开标注数据库失败', '<b>%s</b>' % e)
+            self.labelStore = JsonLabelStore(dirpath)
 
     def undoShapeEdit(self):
         self.canvas.restoreShape()
-        self.labelList.clear()
+        self.labelListModel.clear()
         self.loadShapes(self.canvas.shapes)
         self.actions.undo.setEnabled(self.canvas.isShapeRestorable)
 
     def togglePolygons(self, value):
-        for item, shape in self.labelList.itemsToShapes:
-            item.setCheckState(Qt.Checked if value else Qt.Unchecked)
+        self.labelListModel.setAllVisible(value)
+
+    def onGroupLabels(self, value):
+        self.labelListModel.setGrouped(value)
+        self.labelList.setRootIsDecorated(value)
+        shape = self.editor.selectedShape()
+        if shape:
+            self.selectShapeRow(shape)
 
     def importOfflineTileLayer(self, name):
         self.iface.importOfflineXYZtiles(self.offlineImportDir,name)
@@ -487,7 +972,7 @@ class LabelmePlugin:
             return
         if self.filename is None:
             return
-        currIndex = self.imageList.index(self.filename)
+        currIndex = self.imageList.find(self.filename)
         if currIndex - 1 >= 0:
             filename = self.imageList[currIndex - 1]
             if filename:
@@ -508,7 +993,10 @@ class LabelmePlugin:
         if self.filename is None:
             filename = self.imageList[0]
         else:
-            currIndex = self.imageList.index(self.filename)
+            currIndex = self.imageList.find(self.filename)
+            if currIndex + 1 == len(self.imageList):
+                # the next page of a long search result
+                self.fileListModel.fetchMore()
             if currIndex + 1 < len(self.imageList):
                 filename = self.imageList[currIndex + 1]
             else:
@@ -635,13 +1123,8 @@ class LabelmePlugin:
         self.statusBar().show()
 
         current_filename = self.filename
-        self.importDirImages(self.lastOpenDir, load=False)
-
-        if current_filename in self.imageList:
-            # retain currently selected file
-            self.fileListWidget.setCurrentRow(
-                self.imageList.index(current_filename))
-            self.fileListWidget.repaint()
+        self.importDirImages(
+            self.lastOpenDir, load=False, select=current_filename)
  
     def _saveFile(self, filename):
         if filename and self.saveLabels(filename):
@@ -651,6 +1134,8 @@ class LabelmePlugin:
     def closeFile(self, _value=False):
         if not self.mayContinue():
             return
+        self.compactJournal()
+        self.closeJournal()
         self.resetState()
         self.setClean()
         self.toggleActions(False)
@@ -667,6 +1152,8 @@ class LabelmePlugin:
             #Shape.line_color = self.lineColor
             self.editor.setLineColor(self.lineColor)
             self.canvas.update()
+            # formatShape compares every shape with the default color
+            self._journalAll = True
             self.setDirty()
 
     def chooseColor2(self):
@@ -677,6 +1164,7 @@ class LabelmePlugin:
             #Shape.fill_color = self.fillColor
             self.editor.setFillColor(self.fillColor)
             self.canvas.update()
+            self._journalAll = True
             self.setDirty()
    
 
@@ -691,7 +1179,7 @@ class LabelmePlugin:
         if filename:
             with open(filename) as f:
                 try:
-                    data = json.load(f)
+                    data = json_codec.load(f)
                     nodes = parseDict(data)
                     print('***weps------------------')
                     nodes.print()
@@ -726,6 +1214,7 @@ class LabelmePlugin:
         if color:
             self.canvas.selectedShape.line_color = color
             self.canvas.update()
+            self.markShapeDirty(self.canvas.selectedShape)
             self.setDirty()
 
     def chshapeFillColor(self):
@@ -734,6 +1223,7 @@ class LabelmePlugin:
         if color:
             self.canvas.selectedShape.fill_color = color
             self.canvas.update()
+            self.markShapeDirty(self.canvas.selectedShape)
             self.setDirty()
 
     def copyShape(self):
@@ -743,6 +1233,7 @@ class LabelmePlugin:
 
     def moveShape(self):
         self.canvas.endMove(copy=False)
+        self.markShapeDirty(self.canvas.selectedShape)
         self.setDirty()    
 
 
@@ -753,24 +1244,19 @@ class LabelmePlugin:
         self.shapeSelectionChanged(True)
 
     def resetState(self):
-        self.labelList.clear()
+        self.labelListModel.clear()
         self.filename = None
         self.imagePath = None
         self.imageData = None
         self.labelFile = None
         self.otherData = {} 
+        self._shapeOther = {}
         # self.canvas.resetState() *
 
     @property
     def imageList(self):
-        lst = []
-        for i in range(self.fileListWidget.count()):
-            item = self.fileListWidget.item(i)
-            if(self.shortName):
-                lst.append(self.short_long_name[item.text()])
-            else:
-                lst.append(item.text())
-        return lst
+        '''the paths of the file list, see FileList.'''
+        return self.fileListModel.files
 
     def isShortName(self, filename):
         return (filename.find('/')==-1) and (filename.find('\\')==-1)
@@ -779,15 +1265,15 @@ class LabelmePlugin:
         """Load the specified file, or the last opened file if None."""
         print('* IS short name? ', self.shortName)
         if(self.isShortName(filename)):
-            filename = self.short_long_name[filename]
-        # changing fileListWidget loads file
+            filename = self.imageList.findBasename(filename) or filename
+        # changing the file list selection loads file
         print('\n\n\n*-------------------------------------load a new file --------------------------------------------')
-        if (filename in self.imageList and
-                self.fileListWidget.currentRow() !=
-                self.imageList.index(filename)):
-            self.fileListWidget.setCurrentRow(self.imageList.index(filename))
-            self.fileListWidget.repaint()
+        row = self.imageList.find(filename)
+        if row >= 0 and self.fileListView.currentIndex().row() != row:
+            self.setCurrentFileRow(row)
             return
+        self.compactJournal()
+        self.closeJournal()
         print('*resetState')
         self.resetState()
         if filename is None:
@@ -803,11 +1289,15 @@ class LabelmePlugin:
         label_file = osp.splitext(filename)[0] + '.json'
         if self.output_dir:
             label_file = osp.join(self.output_dir, label_file)
+        # a save of this file may still be on its way to disk
+        self.saveThread.flush(label_file)
+        prefetched = self.takePrefetched(filename, label_file)
+        if prefetched is not None:
+            self.labelFile = prefetched['labelFile']
         #if find the label file for the image
-        if QtCore.QFile.exists(label_file) and \
-                LabelFile.isLabelFile(label_file):
+        elif self.labelStore.exists(label_file):
             try:
-                self.labelFile = LabelFile(label_file)
+                self.labelFile = self.labelStore.load(label_file)
             except LabelFileError as e:
                 self.errorMessage(
                     '打开文件时发生错误',
@@ -816,6 +1306,8 @@ class LabelmePlugin:
                     % (e, label_file))
                 self.status("读文件错误 %s" % label_file)
                 return False
+        recovered = self.recoverJournal(label_file)
+        if self.labelFile:
             self.imagePath = osp.join(
                 osp.dirname(label_file),
                 self.labelFile.imagePath,
@@ -827,20 +1319,16 @@ class LabelmePlugin:
         
         # no matter there has a labelfile. we need to read file here.  some raster must 
         # get statistics
-        print('*call gdal to read file')
-        imageHandle = read(filename) #*
-        if imageHandle is not None:
+        if prefetched is not None:
+            info = prefetched['imageInfo']
+        else:
+            print('*call gdal to read file')
+            info = imageInfo(filename) #*
+        if info is not None:
             # the filename is image not JSON
             self.imagePath = filename
-            self.imageWidth = imageHandle.RasterXSize
-            self.imageHeight = imageHandle.RasterYSize
-            geoTrans = imageHandle.GetGeoTransform()
-            if(math.isclose(geoTrans[0], 0)):
-                self.geoTrans = [0,1,0, self.imageHeight, 0, -1]
-            else:
-                self.geoTrans = geoTrans
+            self.imageWidth, self.imageHeight, self.geoTrans = info
             self.otherData['geoTrans'] = self.geoTrans
-            del imageHandle
         else:
             formats = ['*.{}'.format(fmt.data().decode())
                     for fmt in QtGui.QImageReader.supportedImageFormats()]
@@ -865,20 +1353,88 @@ class LabelmePlugin:
         if self._config['keep_prev']:
             self.loadShapes(prev_shapes)
             print('* load shapes prev ~!~')
+        fileShapes = []
         if self.labelFile:
-            self.loadLabels(self.labelFile.shapes) #his shapes is not labelmeShape
+            fileShapes = self.loadLabels(self.labelFile.shapes) #his shapes is not labelmeShape
             if self.labelFile.flags is not None:
                 self.loadFlags(self.labelFile.flags)
         else:
             print('*the labelFile is None')
+        self.resetJournal(fileShapes)
+        if self._config['keep_prev'] and prev_shapes:
+            # the shapes of the previous image come first, not in the file
+            self._journalAll = True
+        # write the edits rescued from a journal back to the label file
+        if recovered and self.saveLabels(label_file, wait=True):
+            LabelJournal(label_file).discard()
+            self.status("已从日志恢复 %s" % label_file)
 
         self.setClean()
         self.paintCanvas()
         self.addRecentFile(self.filename)
         self.toggleActions(True)
         self.status("加载 %s" % osp.basename(str(filename)))
+        self.schedulePrefetch()
         return True 
 
+    def schedulePrefetch(self):
+        '''read ahead the next and previous images of the file list.'''
+        row = self.imageList.find(self.filename)
+        if row < 0:
+            return
+        prefetch = self._config['prefetch']
+        rows = [row + i for i in range(1, prefetch['next'] + 1)]
+        # the nearest previous image right after the next one
+        rows[1:1] = [row - i for i in range(1, prefetch['prev'] + 1)]
+        self.prefetcher.schedule([self.imageList[r] for r in rows
+                                  if 0 <= r < len(self.imageList)],
+                                 (self.labelStore, self.output_dir))
+
+    def prefetchFile(self, filename, labelStore, output_dir):
+        '''
+        runs in the prefetch thread: the label file and the image info of
+        filename, as loadFile needs them, with a rough size in bytes.
+        labelStore and output_dir are those of the plugin when the file was
+        scheduled, the thread does not read them from self.
+        '''
+        label_file = osp.splitext(filename)[0] + '.json'
+        if output_dir:
+            label_file = osp.join(output_dir, label_file)
+        self.saveThread.flush(label_file)
+        # stat before the load, so a save landing in between shows up as a
+        # changed stat in takePrefetched
+        labelStat = fileStat(label_file)
+        labelFile = None
+        cost = 1024
+        if labelStore.exists(label_file):
+            labelFile = labelStore.load(label_file)
+            # a [x, y] list of floats is about 100 bytes
+            cost += sum(len(shape[1]) for shape in labelFile.shapes) * 100
+        # also writes the statistics (.omd) the viewer needs
+        info = imageInfo(filename)
+        if info is None:
+            return None, 0
+        return dict(
+            labelFile=labelFile,
+            labelPath=label_file,
+            labelStore=labelStore,
+            labelStat=labelStat,
+            imageInfo=info,
+        ), cost
+
+    def takePrefetched(self, filename, label_file):
+        '''
+        the prefetched data of filename if it was read from label_file, in
+        the current label store, and the label file did not change since.
+        '''
+        prefetched = self.prefetcher.take(filename)
+        if prefetched is None or \
+                prefetched['labelStore'] is not self.labelStore or \
+                prefetched['labelPath'] != label_file or \
+                prefetched['labelStat'] != fileStat(label_file):
+            return None
+        return prefetched
+
     def setClean(self):
         self.dirty = False
         self.actions.save.setEnabled(False)
@@ -997,13 +1553,30 @@ class LabelmePlugin:
 
 
     def createDockWidgets(self):
-        self.labelList = LabelQListWidget()
+        # a model/view list over the shapes: rows are only created for what
+        # is on screen, visibility is toggled per shape or per label
+        self.labelListModel = LabelListModel()
+        self.labelListModel.visibilityChanged.connect(
+            self.shapesVisibilityChanged)
+        self.labelList = QtWidgets.QTreeView()
+        self.labelList.setHeaderHidden(True)
+        self.labelList.setRootIsDecorated(False)
+        self.labelList.setUniformRowHeights(True)
+        self.labelList.setModel(self.labelListModel)
         self.lastOpenDir = None
-        self.labelList.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
-        self.labelList.setParent(self.mainWnd)
+        self.groupLabels = QtWidgets.QPushButton('按标签分组')
+        self.groupLabels.setCheckable(True)
+        self.groupLabels.toggled.connect(self.onGroupLabels)
+        shapeListLayout = QtWidgets.QVBoxLayout()
+        shapeListLayout.setContentsMargins(0, 0, 0, 0)
+        shapeListLayout.setSpacing(0)
+        shapeListLayout.addWidget(self.labelList)
+        shapeListLayout.addWidget(self.groupLabels)
+        shapeListWidget = QtWidgets.QWidget()
+        shapeListWidget.setLayout(shapeListLayout)
         self.shape_dock = QtWidgets.QDockWidget('多边形标签', self.mainWnd)
         self.shape_dock.setObjectName('Labels')
-        self.shape_dock.setWidget(self.labelList)
+        self.shape_dock.setWidget(shapeListWidget)
         self.iface.addDockWidget(Qt.RightDockWidgetArea, self.shape_dock) #
 
 
@@ -1023,6 +1596,10 @@ class LabelmePlugin:
         self.fileSearch = QtWidgets.QLineEdit()
         self.fileSearch.setPlaceholderText('搜索文件')
         self.fileSearch.textChanged.connect(self.fileSearchChanged)
+        self.fileSearchTimer = QtCore.QTimer()
+        self.fileSearchTimer.setSingleShot(True)
+        self.fileSearchTimer.setInterval(200)
+        self.fileSearchTimer.timeout.connect(self.applyFileSearch)
         self.showAllFiles = QtWidgets.QPushButton('显示所有')
         self.showAllFiles.setCheckable(True)
         self.showAllFiles.toggled.connect(self.onShowAllFiles)
@@ -1030,9 +1607,28 @@ class LabelmePlugin:
         layout = QtWidgets.QHBoxLayout()
         layout.addWidget(self.fileSearch)
         layout.addWidget(self.showAllFiles)
-        self.fileListWidget = QtWidgets.QListWidget()
-        self.fileListWidget.itemSelectionChanged.connect(
-            self.fileSelectionChanged
+        # a model/view list: rows are only created for what is on screen
+        self.fileListModel = FileListModel()
+        self.fileListView = QtWidgets.QTreeView()
+        self.fileListView.setRootIsDecorated(False)
+        self.fileListView.setItemsExpandable(False)
+        self.fileListView.setUniformRowHeights(True)
+        self.fileListView.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectRows)
+        self.fileListView.setModel(self.fileListModel)
+        header = self.fileListView.header()
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        for column, width in ((1, 90), (2, 60)):
+            header.setSectionResizeMode(
+                column, QtWidgets.QHeaderView.Interactive)
+            header.resizeSection(column, width)
+        if not self._config['file_list_metadata']:
+            self.fileListView.setColumnHidden(1, True)
+            self.fileListView.setColumnHidden(2, True)
+            self.fileListView.setHeaderHidden(True)
+        self.fileListView.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.fileSelectionChanged()
         )
 
         fileListLayout = QtWidgets.QVBoxLayout()
@@ -1040,7 +1636,7 @@ class LabelmePlugin:
         fileListLayout.setSpacing(0)
         #fileListLayout.addWidget(self.fileSearch)
         fileListLayout.addLayout(layout)
-        fileListLayout.addWidget(self.fileListWidget)
+        fileListLayout.addWidget(self.fileListView)
         self.noPath = QtWidgets.QPushButton('隐藏路径')
         self.noPath.setCheckable(True)
         self.noPath.toggled.connect(self.onNoPath)
@@ -1067,25 +1663,18 @@ class LabelmePlugin:
         self.flag_widget.itemChanged.connect(self.setDirty)
         self.iface.addDockWidget(Qt.RightDockWidgetArea, self.flag_dock)
         #signals and slots
-        self.labelList.itemActivated.connect(self.labelSelectionChanged)
-        self.labelList.itemSelectionChanged.connect(self.labelSelectionChanged)
-        self.labelList.itemDoubleClicked.connect(self.editLabel)
-        # Connect to itemChanged to detect checkbox changes.
-        self.labelList.itemChanged.connect(self.labelItemChanged)
-        self.labelList.setDragDropMode(
-            QtWidgets.QAbstractItemView.InternalMove)
+        self.labelList.activated.connect(
+            lambda index: self.labelSelectionChanged())
+        self.labelList.selectionModel().selectionChanged.connect(
+            lambda selected, deselected: self.labelSelectionChanged())
+        self.labelList.doubleClicked.connect(self.editLabel)
 
     def onNoPath(self,e):
         self.shortName =  e
+        self.fileListModel.setShortName(self.shortName)
         if(not self.shortName):
-            for i in range(self.fileListWidget.count()):
-                item = self.fileListWidget.item(i)
-                item.setText(self.short_long_name[item.text()])
             self.noPath.setText('隐藏路径')
         else:
-            for i in range(self.fileListWidget.count()):
-                item = self.fileListWidget.item(i)
-                item.setText(osp.basename(item.text()))
             self.noPath.setText('显示路径')
         print('* self.shortName', self.shortName)
 
@@ -1225,7 +1814,7 @@ class LabelmePlugin:
         undoLastPoint = action('撤销最后的点', self.editor.undoLastPoint,
                                shortcuts['undo_last_point'], 'undo',
                                'Undo last drawn point', enabled=False)
-        addPoint = action('在边上添加点', self.editor.addPointToEdge,
+        addPoint = action('在边上添加点', self.addPointToEdge,
                           None, 'edit', 'Add point to the nearest edge',
                           enabled=False)
         undo = action('撤销', self.undoShapeEdit, shortcuts['undo'], 'undo',
@@ -1395,7 +1984,7 @@ class LabelmePlugin:
         # this signal is export from riverMon
         self.editor.drawingPolygon.connect(self.toggleDrawingSensitive)
         self.editor.newShape.connect(self.newShape)
-        self.editor.shapeMoved.connect(self.setDirty)
+        self.editor.shapeMoved.connect(self.shapeMoved)
         self.editor.selectionChanged.connect(self.shapeSelectionChanged)
         self.editor.enabled.connect(self.editorEnabled)
         self.editor.edgeSelected.connect(self.actions.addPoint.setEnabled)
@@ -1452,38 +2041,6 @@ class LabelmePlugin:
         for action in self.actions.onLoadActive:
             action.setEnabled(value)
 
-    def scanAllImages(self, folderPath):
-        extensions = self.supportedFmts
-        images = []        
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = osp.join(root, file)
-                    images.append(relativePath)            
-        images = set(images)
-        images = list(images)
-        images.sort(key=lambda x: x.lower())
-        return images
-
-    def scanTileImages(self, tiledImagefolder):
-        '''
-        scan the tiled image filder. return all tiled image in this folder.
-        '''
-        extensions = self.supportedFmts
-        images = []
-        for root, dirs, files in os.walk(tiledImagefolder):
-            for dir in dirs:
-                imgs = []
-                for root_,  _, filess in os.walk(osp.join(root,dir)):
-                    for file in filess:
-                        if file.lower().endswith(tuple(extensions)):
-                            relativePath = osp.join(root_, file)
-                            imgs.append(relativePath)
-                if(len(imgs) > 0):
-                    imgs.sort(key=lambda x: x.lower())
-                    images.append(imgs)
-        return images
-
     def validateLabel(self, label):
         # no validation
         if self._config['validate_label'] is None:
@@ -1500,34 +2057,24 @@ class LabelmePlugin:
                     return True
         return False
 
-    def currentItem(self):
-        items = self.labelList.selectedItems()
-        if items:
-            return items[0]
+    def currentShape(self):
+        indexes = self.labelList.selectionModel().selectedIndexes()
+        if indexes:
+            return self.labelListModel.shapeOf(indexes[0])
         return None
 
     def labelSelectionChanged(self):
-        item = self.currentItem()
-        if item and (self.editor.isEditing() or self.editor.canBreak()):
+        shape = self.currentShape()
+        if shape and (self.editor.isEditing() or self.editor.canBreak()):
             self._noSelectionSlot = True
-            shape = self.labelList.get_shape_from_item(item)
             self.editor.selectShape(shape)
             self.editor.moveToSelectedShape()
 
-    def labelItemChanged(self, item):
-        print('* labelItemChanged')
-        shape = self.labelList.get_shape_from_item(item)
-        print('* shape type is ', type(shape))
-        label = str(item.text())
-        if label != shape.getLabel():
-            print('* shape label is not equal, shape.label={}'.format(shape.getLabel()))
-            #shape.label = str(item.text())
-            shape.setLabel(str(item.text()))
-            self.setDirty()
-        else:  # User probably changed item visibility
-            print('*set visible') 
-            self.editor.setShapeVisible(shape, item.checkState() == Qt.Checked)
-    
+    def shapesVisibilityChanged(self, shapes, visible):
+        '''the check boxes of the shape dock, see LabelListModel.'''
+        for shape in shapes:
+            self.editor.setShapeVisible(shape, visible)
+
     def loadRecent(self, filename):
         if self.mayContinue():
             self.loadFile(filename)
@@ -1605,6 +2152,14 @@ class LabelmePlugin:
         self.settings.setValue('fill/color', self.fillColor)
         self.settings.setValue('recentFiles', self.recentFiles)
         self.settings.sync()
+        self.stopScan()
+        self.stopDirWatcher()
+        self.compactJournal(wait=True)
+        self.closeJournal()
+        self.prefetcher.stop()
+        self.metaThread.stop()
+        self.saveThread.stop()
+        self.labelStore.close()
         # ask the use for where to save the labels
         # self.settings.setValue('window/geometry', self.saveGeometry())
 
@@ -1625,7 +2180,7 @@ class LabelmePlugin:
         if (e):
             self.editor.clearShapes()
             self.iface.reset() 
-            self.iface.openFiles(self.imageList)
+            self.iface.openFiles(list(self.imageList))
             self.actions.save.setEnabled(False)
             self.actions.createMode.setEnabled(False)
             self.actions.createRectangleMode.setEnabled(False)
@@ -1697,7 +2252,7 @@ class LabelmePlugin:
         return the output dir.
         '''
         print('\n\n\n*-------------------------------------SPLIT FILES--------------------------------------------')
-        jsons = glob.glob(self.lastOpenDir + '/**/*.json', recursive=True)
+        jsons = self.labelFilesIn(self.lastOpenDir)
         jsonNum = len(jsons)
         self.labels = set()
         exts = ['.tif','.env', '.pix', '.img', '.tiff', '.ecw', '.tga', '.jpg']
@@ -1724,124 +2279,117 @@ class LabelmePlugin:
                 validBlocks = []
                 #load json
                 print('* begin to load json file', label_file)
-                with open(label_file) as f:
-                    data = json.load(f)  #data is json file's content
-                    imagePath = data['imagePath']
-                    lineColor = data['lineColor']
-                    fillColor = data['fillColor']
-                    imageHeight = data['imageHeight']
-                    imageWidth = data['imageWidth']
-                    flags = data['flags']
-                    otherData = {}
-                    keys = [
-                        'imageData',
-                        'imagePath',
-                        'lineColor',
-                        'fillColor',
-                        'shapes',  # polygonal annotations
-                        'flags',   # image level flags
-                        'imageHeight',
-                        'imageWidth',]
-                    for key, value in data.items():
-                        if key not in keys:
-                            otherData[key] = value
-                    geoTrans = otherData['geoTrans']
-                    mapfunc = functools.partial(img2map_p, geoTrans)
-                    tile_x_count = math.ceil(imageWidth/tileSz)
-                    tile_y_count = math.ceil(imageHeight/tileSz)
-                    print('*',extension)
-                    print('* @|@json load, image width is {}, image height is {}, tile_x_count is {}, tile_y_count is {}'.format(imageWidth, imageHeight, tile_x_count,tile_y_count))
-                    for row in range(tile_y_count):
-                        for col in range(tile_x_count):
-                            if(col == (tile_x_count -1)):
-                                iw = imageWidth - col * tileSz
-                            else:
-                                iw = tileSz
-                            if(row == (tile_y_count -1)):
-                                ih = imageHeight - row * tileSz
-                            else:
-                                ih = tileSz
-                            #get the tiles rect (image coordination system)
-                            tileRect = QtCore.QRectF(
-                                col*tileSz,
-                                row*tileSz,
-                                iw, ih)
-                            shapes = []
-                            for s in data['shapes']:
-                                self.labels.add(s['label'])
-                                shape_type = s.get('shape_type', 'polygon')
-                                points = s['points']
-                                if(shape_type == 'rectangle'):
-                                    rect = QtCore.QRectF(QPoint(*map2img(geoTrans,points[0][0],points[0][1])),
-                                        QPoint(*map2img(geoTrans,points[1][0],points[1][1])))
-                                    if(rect.intersects(tileRect)):
-                                        print('* @|@ tile({},{}) get intersected rectangle, write to label ...'.format(row,col))
-                                        intersected = tileRect.intersected(rect)
-                                        if(math.isclose(geoTrans[0], 0)):
-                                            UL = offset(tileSz, row, col, intersected.topLeft().x(), intersected.topLeft().y())
-                                            LR = offset(tileSz, row, col, intersected.bottomRight().x(), intersected.bottomRight().y())
-                                        else:
-                                            UL = img2map(geoTrans,intersected.topLeft().x(), intersected.topLeft().y())
-                                            LR = img2map(geoTrans,intersected.bottomRight().x(), intersected.bottomRight().y())
-                                        copyS = copy.deepcopy(s)
-                                        copyS['points'] = [UL,LR]
-                                        shapes.append(copyS)                                        
-                                elif(shape_type == 'polygon' or shape_type=='slantRectangle' ):
-                                    tilePolygon = QtGui.QPolygonF(tileRect)
-                                    ps = []
-                                    for pnt in points:
-                                        ps.append(QPointF(*map2img(geoTrans,pnt[0],pnt[1])))
-                                    polygon = QtGui.QPolygonF(ps)
-                                    polygon = polygon.intersected(tilePolygon)
-                                    if(len(polygon) > 0):
-                                        print('* @|@ tile({},{}) get intersected polygon, write to label ...'.format(row,col))
-                                        copyS = copy.deepcopy(s)
-                                        if(math.isclose(geoTrans[0], 0)):
-                                            pts = [offset(tileSz, row, col, pnt.x(), pnt.y()) for pnt in polygon]
-                                        else:
-                                            pts = [(pnt.x(), pnt.y()) for pnt in polygon]
-                                            pts = list(map(mapfunc, pts))
-                                        copyS['points'] = pts 
-                                        shapes.append(copyS) 
-                            print('*',self.labels)
-                            if(self.labels is None):
-                                continue
-                            label_file_t = osp.join(outDir, '{}_{}_{}.{}'.format(base, row, col, 'json'))
-                            print('*',extension)
-                            imagePath = '{}_{}_{}.{}'.format(base, row, col, extension[1:])
-                            if (len(shapes) == 0):
-                                continue
-                            validBlocks.append(QtCore.QPoint(col, row))
-                            #begin to create json file for the block file
-                            if(math.isclose(geoTrans[0], 0)):
-                                otherData['geoTrans'] = [0,1,0,ih,0,-1]
-                            else:
-                                otherData['geoTrans'] = [geoTrans[0]+geoTrans[1]*col*tileSz,
-                                                            geoTrans[1],
-                                                            geoTrans[2],
-                                                            geoTrans[3] + geoTrans[5]*row*tileSz,
-                                                            geoTrans[4],
-                                                            geoTrans[5]]
-                            print('* @|@ label_file_t', label_file_t)
-                            lf = LabelFile()
-                            try:
-                                lf.save(
-                                    filename=label_file_t,
-                                    shapes=shapes,
-                                    imagePath=imagePath,
-                                    imageData=None,
-                                    imageHeight=ih,
-                                    imageWidth=iw,
-                                    lineColor=lineColor,
-                                    fillColor=fillColor,
-                                    otherData=otherData,
-                                    flags=flags,
-                                )
-                            except Exception as e:
-                                self.errorMessage(
-                                    '写标签文件失败',
-                                    '关闭数据集文件夹后重试.')
-                                return
+                source = LabelFile(label_file, loadImageData=False)
+                imagePath = source.imagePath
+                lineColor = source.lineColor
+                fillColor = source.fillColor
+                imageHeight = source.imageHeight
+                imageWidth = source.imageWidth
+                if not imageHeight or not imageWidth:
+                    # not in the label file: the header of the image has it
+                    meta = rasterMeta(img_file)
+                    if meta is None:
+                        raise IOError('gdal cannot open {}'.format(img_file))
+                    imageHeight, imageWidth = meta['height'], meta['width']
+                flags = source.flags
+                otherData = source.otherData
+                geoTrans = otherData['geoTrans']
+                mapfunc = functools.partial(img2map_p, geoTrans)
+                tile_x_count = math.ceil(imageWidth/tileSz)
+                tile_y_count = math.ceil(imageHeight/tileSz)
+                print('*',extension)
+                print('* @|@json load, image width is {}, image height is {}, tile_x_count is {}, tile_y_count is {}'.format(imageWidth, imageHeight, tile_x_count,tile_y_count))
+                for row in range(tile_y_count):
+                    for col in range(tile_x_count):
+                        if(col == (tile_x_count -1)):
+                            iw = imageWidth - col * tileSz
+                        else:
+                            iw = tileSz
+                        if(row == (tile_y_count -1)):
+                            ih = imageHeight - row * tileSz
+                        else:
+                            ih = tileSz
+                        #get the tiles rect (image coordination system)
+                        tileRect = QtCore.QRectF(
+                            col*tileSz,
+                            row*tileSz,
+                            iw, ih)
+                        shapes = []
+                        for s in source.shapes:
+                            label, points, _, _, shape_type, _ = s
+                            self.labels.add(label)
+                            if(shape_type == 'rectangle'):
+                                rect = QtCore.QRectF(QPoint(*map2img(geoTrans,points[0][0],points[0][1])),
+                                    QPoint(*map2img(geoTrans,points[1][0],points[1][1])))
+                                if(rect.intersects(tileRect)):
+                                    print('* @|@ tile({},{}) get intersected rectangle, write to label ...'.format(row,col))
+                                    intersected = tileRect.intersected(rect)
+                                    if(math.isclose(geoTrans[0], 0)):
+                                        UL = offset(tileSz, row, col, intersected.topLeft().x(), intersected.topLeft().y())
+                                        LR = offset(tileSz, row, col, intersected.bottomRight().x(), intersected.bottomRight().y())
+                                    else:
+                                        UL = img2map(geoTrans,intersected.topLeft().x(), intersected.topLeft().y())
+                                        LR = img2map(geoTrans,intersected.bottomRight().x(), intersected.bottomRight().y())
+                                    copyS = LabelFile.shapeDictOf(s)
+                                    copyS['points'] = [UL,LR]
+                                    shapes.append(copyS)                                        
+                            elif(shape_type == 'polygon' or shape_type=='slantRectangle' ):
+                                tilePolygon = QtGui.QPolygonF(tileRect)
+                                ps = []
+                                for pnt in points:
+                                    ps.append(QPointF(*map2img(geoTrans,pnt[0],pnt[1])))
+                                polygon = QtGui.QPolygonF(ps)
+                                polygon = polygon.intersected(tilePolygon)
+                                if(len(polygon) > 0):
+                                    print('* @|@ tile({},{}) get intersected polygon, write to label ...'.format(row,col))
+                                    copyS = LabelFile.shapeDictOf(s)
+                                    if(math.isclose(geoTrans[0], 0)):
+                                        pts = [offset(tileSz, row, col, pnt.x(), pnt.y()) for pnt in polygon]
+                                    else:
+                                        pts = [(pnt.x(), pnt.y()) for pnt in polygon]
+                                        pts = list(map(mapfunc, pts))
+                                    copyS['points'] = pts 
+                                    shapes.append(copyS) 
+                        print('*',self.labels)
+                        if(self.labels is None):
+                            continue
+                        label_file_t = osp.join(outDir, '{}_{}_{}.{}'.format(base, row, col, 'json'))
+                        print('*',extension)
+                        imagePath = '{}_{}_{}.{}'.format(base, row, col, extension[1:])
+                        if (len(shapes) == 0):
+                            continue
+                        validBlocks.append(QtCore.QPoint(col, row))
+                        #begin to create json file for the block file
+                        if(math.isclose(geoTrans[0], 0)):
+                            otherData['geoTrans'] = [0,1,0,ih,0,-1]
+                        else:
+                            otherData['geoTrans'] = [geoTrans[0]+geoTrans[1]*col*tileSz,
+                                                        geoTrans[1],
+                                                        geoTrans[2],
+                                                        geoTrans[3] + geoTrans[5]*row*tileSz,
+                                                        geoTrans[4],
+                                                        geoTrans[5]]
+                        print('* @|@ label_file_t', label_file_t)
+                        lf = LabelFile()
+                        try:
+                            lf.save(
+                                filename=label_file_t,
+                                shapes=shapes,
+                                imagePath=imagePath,
+                                imageData=None,
+                                imageHeight=ih,
+                                imageWidth=iw,
+                                lineColor=lineColor,
+                                fillColor=fillColor,
+                                otherData=otherData,
+                                flags=flags,
+                                binaryPoints=self._config['binary_points'],
+                            )
+                        except Exception as e:
+                            self.errorMessage(
+                                '写标签文件失败',
+                                '关闭数据集文件夹后重试.')
+                            return
                 if(validBlocks):
                     self.iface.gdal2Tile(img_file,tileSz, outDir, validBlocks)
             labels_file = osp.join(here, 'labels.txt')
@@ -1889,20 +2437,26 @@ class LabelmePlugin:
         else:
             os.makedirs(osp.join(self.exportOutDir, 'Annotations'))
 
+        with gdalProfile('export'):
+            self.exportDataset()
+        mb = QtWidgets.QMessageBox
+        msg =  '导出数据集成功,可查看数据集'
+        answer = mb.information(self.mainWnd,
+                            '导出数据完成',
+                            msg)  
+        os.startfile(self.export_dialog.txtOutDir.text())
+
+    def exportDataset(self):
+        # the exporters read the json layout, bring it up to date first
+        self.labelStore.exportJson()
+        self.labelStore.refresh()
         self.isTiled = False
         if(self.export_dialog.chkTiled.isChecked()):  #need to split to tiles
             out = self.splitFile()
             dir = out 
             self.isTiled = True
         else:
-            jsons = glob.glob(self.lastOpenDir + '/**/*.json', recursive=True)
-            jsonNum = len(jsons)
-            self.labels = set()
-            for label_file in jsons:
-                with open(label_file) as f:
-                    data = json.load(f)  #data is json file's content
-                    for s in data['shapes']:
-                        self.labels.add(s['label'])
+            self.labels = self.labelStore.labels()
             labels_file = osp.join(here, 'labels.txt')
             with open(labels_file,'w') as f:
                 f.write('__ignore__\n')
@@ -1915,12 +2469,6 @@ class LabelmePlugin:
             self.exportAsVOC(dir)
         else:
             self.exportAsCOCO(dir)
-        mb = QtWidgets.QMessageBox
-        msg =  '导出数据集成功,可查看数据集'
-        answer = mb.information(self.mainWnd,
-                            '导出数据完成',
-                            msg)  
-        os.startfile(self.export_dialog.txtOutDir.text())
 
     def exportAsCOCO(self, dir):
         if self.isTiled:
@@ -1929,7 +2477,7 @@ class LabelmePlugin:
             self.exportNoTiledResultAsCOCO(dir)
 
     def exportNoTiledResultAsCOCO(self, dir):
-        jsons = glob.glob(dir + '/**/*.json', recursive=True)
+        jsons = self.labelFilesIn(dir)
         outdir = self.export_dialog.txtOutDir.text()
         for json in jsons:
             js = [json]
@@ -1952,31 +2500,44 @@ class LabelmePlugin:
                 shutil.copy(img_file, subFolder)
 
     def exportTiledResultAsCOCO(self, dir):
-        cds = childDir(dir)  #get next leve folder name. without path name
-        for child in cds:
-            jsons = glob.glob(osp.join(dir,child) + '/**/*.json', recursive=True)
-            outdir = self.export_dialog.txtOutDir.text()
+        # the image moved along with a json, in order of preference
+        exts = ['.tif','.env', '.pix', '.img', '.tiff', '.ecw', '.tga', '.jpg']
+        outdir = self.export_dialog.txtOutDir.text()
+        # one walk of dir; a next level folder is exported once its subtree
+        # was scanned, while the scan goes on
+        for childPath, files in scanTileGroups(dir, ['.json'] + exts, depth=1):
+            child = osp.basename(childPath)
+            jsons = []
+            images = {}
+            for f in files:
+                stem, ext = my_splitext(f)
+                ext = '.' + ext.lower()
+                if ext != '.json':
+                    images[(stem, ext)] = f
+                elif not osp.basename(f).startswith('.'):
+                    jsons.append(f)
+            if not jsons:
+                continue
             output_json = osp.join(outdir, 'coco_{}.json'.format(child))
             labelme2coco(jsons, output_json)
             # move image files to Annotations folder
+            subFolder = osp.join(outdir, 'Annotations', child)
+            if(not osp.exists(subFolder)):
+                os.makedirs(subFolder)
             for json in jsons:
                 filePathWithoutExt = my_splitext(json)[0]
-                #for every json file, we create a folder in Annotations
-                subFolder = osp.join(outdir, 'Annotations', child)
-                if(not osp.exists(subFolder)):
-                    os.makedirs(subFolder)
-                #find the image file to be move
-                exts = ['.tif','.env', '.pix', '.img', '.tiff', '.ecw', '.tga', '.jpg']
-                e = '.tif'
-                findImg = False
+                #find the image file to be move, from the scanned files
                 for ext in exts:
-                    img_file = filePathWithoutExt + ext
-                    if(osp.exists(img_file)):
-                        findImg = True
-                        e = ext
-                        break 
-                if findImg:
-                    shutil.copy(img_file, subFolder)
+                    img_file = images.get((filePathWithoutExt, ext))
+                    if img_file is not None:
+                        shutil.copy(img_file, subFolder)
+                        break
+
+    def labelFilesIn(self, dir):
+        '''label files below dir, from the label index when dir is the dataset.'''
+        if dir == self.labelStore.root:
+            return self.labelStore.labelFiles()
+        return glob.glob(dir + '/**/*.json', recursive=True)
 
     def onOpenInExplorer(self):
         if(self.lastOpenDir is not None):
@@ -2006,37 +2567,23 @@ class LabelmePlugin:
             f.writelines('\n'.join(class_names))
         print('*Saved class_names:', out_class_names_file)
         #########
-        jsons = glob.glob(dir + '/**/*.json', recursive=True)
+        jsons = self.labelFilesIn(dir)
         print('*export dir: {}'.format(dir))
         jsonNum = len(jsons)
         for i, label_file in enumerate(jsons):
-            with open(label_file) as f:
-                data = json.load(f)  #data is json file's content
-                #get geo trans parameters from json file
-                otherData = {}
-                keys = [
-                    'imageData',
-                    'imagePath',
-                    'lineColor',
-                    'fillColor',
-                    'shapes',  # polygonal annotations
-                    'flags',   # image level flags
-                    'imageHeight',
-                    'imageWidth',]
-                for key, value in data.items():
-                    if key not in keys:
-                        otherData[key] = value
-                geoTrans = otherData['geoTrans']
+            lf = LabelFile(label_file, loadImageData=False)
+            #get geo trans parameters from json file
+            geoTrans = lf.otherData['geoTrans']
             #make dirs for voc
             base = osp.splitext(osp.basename(label_file))[0]
             out_img_file = osp.join(
-                self.exportOutDir, 'JPEGImages', data['imagePath'])
+                self.exportOutDir, 'JPEGImages', lf.imagePath)
             out_xml_file = osp.join(
                 self.exportOutDir, 'Annotations', base + '.xml')
             out_viz_file = osp.join(
                 self.exportOutDir, 'AnnotationsVisualization', base + '.tif')
             # get the image file to copy to ...
-            img_file = osp.join(osp.dirname(label_file), data['imagePath'])
+            img_file = osp.join(osp.dirname(label_file), lf.imagePath)
             print('*export',img_file)
             print('*to', out_img_file)
             shape = gdalCopy(img_file, out_img_file)
@@ -2044,7 +2591,7 @@ class LabelmePlugin:
             maker = lxml.builder.ElementMaker()
             xml = maker.annotation(
                 maker.folder('JPEGImages'),
-                maker.filename(data['imagePath']),
+                maker.filename(lf.imagePath),
                 maker.path(out_img_file),
                 maker.source(maker.database('Unknown')),    # e.g., The VOC2007 Database
                 maker.size(
@@ -2059,7 +2606,8 @@ class LabelmePlugin:
             labels = []
             colors = [] 
             unkown_class_type = False 
-            for shape in data['shapes']:
+            for s in lf.shapes:
+                shape = LabelFile.shapeDictOf(s)
                 if shape['shape_type'] != 'rectangle' \
                     and shape['shape_type'] != 'polygon' \
                     and shape['shape_type'] != 'slantRectangle':
@@ -2118,11 +2666,8 @@ class LabelmePlugin:
            
             if(captions and self.isTiled):
                 self.statusBar().showMessage('正在给文件{}画实例'.format(img_file))
-                (pathName,extension) = os.path.splitext(img_file)
-                omd = pathName + '.omd'
-                if(not osp.exists(omd)):
-                    img = read(img_file)
-                    del img
+                # the stretch (.omd) of the image, see rasterInfo
+                rasterInfo(img_file)
                 self.iface.draw_instances(img_file, out_viz_file, bboxes, colors, captions)  
 
             if(not self.isTiled):
@@ -2155,46 +2700,33 @@ class LabelmePlugin:
 #                                          GDAL                                        
 ########################################################################################################
 import numpy as np
-def read(filename):
-    img = None
+def imageInfo(filename):
+    '''(width, height, geoTrans) of the image, None if gdal cannot read it.'''
     try:
-        img = gdal.Open(filename)
-        if(img is None):
-            return None
-
-        datatype = img.GetRasterBand(1).DataType
-        print('* @|@ read file, datatype$$$$$$$$$$$$$$$$$$$$$$$$$$$$$', datatype) 
-        '''
-        desc = img.GetDescription()
-        metadata = img.GetMetadata() #
-        print('*Raster description: {desc}'.format(desc=desc))
-        print('*Raster metadata:')
-        print(metadata) # {'AREA_OR_POINT': 'Area'}
-        print('\n')
-        '''
-        if (datatype != 1):
-            bandNum = img.RasterCount
-            (filepath,tempfilename) = os.path.split(filename)
-            (shotname,extension) = os.path.splitext(tempfilename)
-            omd = filepath + '/' + shotname + '.omd'
-            print('*the omd file is', omd)
-            if not osp.exists(omd):
-                omdf = open(omd, 'w')
-                omdf.write('number_bands:  {}\n\n'.format(bandNum))
-                for bandIdx in np.arange(1, bandNum+1):
-                    band = img.GetRasterBand(int(bandIdx))
-                    stats = band.GetStatistics(0,1) #if no statistic , it will compute
-                    omdf.write('band{}.min_value:  {}\n'.format(bandIdx, stats[0]))
-                    omdf.write('band{}.max_value:  {}\n'.format(bandIdx, stats[1]))
-                    print('*', stats)
+        info = rasterInfo(filename)
     except Exception:
         print('*gdal read {}, failed'.format(filename))
-        exstr = traceback.format_exc()
-        print (exstr)
-    return img
-        
+        print(traceback.format_exc())
+        return None
+    if info is None:
+        return None
+    width = info['width']
+    height = info['height']
+    geoTrans = info['geoTrans']
+    if(math.isclose(geoTrans[0], 0)):
+        geoTrans = [0,1,0, height, 0, -1]
+    return width, height, geoTrans
+
+def fileStat(path):
+    '''(mtime, size) of path, None if it does not exist.'''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
 def gdalCopy(src_filename, dst_filename):
-    src_ds = gdal.Open( src_filename )
     #Open output format driver, see gdal_translate --formats for list
     #format = "GTiff"
     #driver = gdal.GetDriverByName( format )
@@ -2202,8 +2734,10 @@ def gdalCopy(src_filename, dst_filename):
     #dst_ds = driver.CreateCopy( dst_filename, src_ds, 0 )
     #Properly close the datasets to flush to disk
     #dst_ds = None
-    w, h, d = src_ds.RasterXSize, src_ds.RasterYSize, src_ds.RasterCount
-    src_ds = None
+    meta = rasterMeta(src_filename)
+    if meta is None:
+        raise IOError('gdal cannot open {}'.format(src_filename))
+    w, h, d = meta['width'], meta['height'], meta['bands']
     shutil.copy(src_filename, dst_filename)
     return w,h,d
 
@@ -2233,15 +2767,6 @@ def boundingBox(points):
     max_x, max_y = np.max(points, 0)[0], np.max(points, 0)[1]
     return (min_x, min_y), (max_x, max_y)
 
-def childDir(dir):
-    dirs = []
-    files = os.listdir(dir)
-    for f in files:
-        fullPathName = osp.join(dir,f)
-        if osp.isdir(fullPathName):
-            dirs.append(f)
-    return dirs
-
 class JsonNode(object):
     def __init__(self, name = None):
         if name is not None:
@@ -6,7 +6,6 @@ from .label_dialog import *
 from .tool_bar import *
 from .label_file import *
 from .labelme2COCO import *
-from .label_qlist_widget import *
 from .escapable_qlist_widget import *
 from .utils import struct
 from .utils import addActions
@@ -60,6 +60,9 @@ def validate_config_item(key, value):
     if key == 'validate_label' and value not in [None, 'exact', 'instance']:
         raise ValueError('Unexpected value `{}` for key `{}`'
                          .format(value, key))
+    if key == 'label_backend' and value not in ['json', 'sqlite']:
+        raise ValueError('Unexpected value `{}` for key `{}`'
+                         .format(value, key))
 
 
 def get_config(config_from_args=None, config_file=None):
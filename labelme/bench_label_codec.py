@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import random
+import time
+
+from labelme import json_codec
+from labelme.label_file import LabelFile
+
+
+def syntheticLabels(shapes, points):
+    '''a label file dict with `shapes` polygons of `points` points each.'''
+    rnd = random.Random(0)
+    data = dict(
+        version=1,
+        flags={},
+        shapes=[],
+        lineColor=[0, 255, 0, 128],
+        fillColor=[255, 0, 0, 128],
+        imagePath='synthetic.tif',
+        imageData=None,
+        imageHeight=10000,
+        imageWidth=10000,
+        geoTrans=[500000.0, 0.5, 0.0, 4000000.0, 0.0, -0.5],
+    )
+    for i in range(shapes):
+        x0 = rnd.uniform(500000.0, 505000.0)
+        y0 = rnd.uniform(3995000.0, 4000000.0)
+        data['shapes'].append(LabelFile.shapeDict(
+            label='building_{}'.format(i % 7),
+            points=[[x0 + rnd.uniform(0, 30), y0 + rnd.uniform(0, 30)]
+                    for _ in range(points)],
+            line_color=None,
+            fill_color=None,
+            shape_type='polygon',
+            probability=rnd.random(),
+        ))
+    return data
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='parse/dump throughput of the label file json codecs',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--shapes', type=int, default=20000)
+    parser.add_argument('--points', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data = syntheticLabels(args.shapes, args.points)
+    backends = ['json']
+    if json_codec.ujson is not None:
+        backends.append('ujson')
+    if json_codec.orjson is not None:
+        backends.append('orjson')
+    print('{} shapes x {} points, default backend: {}'.format(
+        args.shapes, args.points, json_codec.name))
+    print('{:8} {:8} {:>9} {:>12} {:>12}'.format(
+        'backend', 'mode', 'size MB', 'dump MB/s', 'parse MB/s'))
+
+    default, compact = json_codec.name, json_codec.compact
+    try:
+        for name in backends:
+            json_codec.name = name
+            for mode in ('indent', 'compact'):
+                json_codec.setCompact(mode == 'compact')
+                text = json_codec.dumps(data, indent=2)
+                mb = len(text.encode('utf-8')) / 1024.0 / 1024.0
+                dump = best(lambda: json_codec.dumps(data, indent=2),
+                            args.repeat)
+                parse = best(lambda: json_codec.loads(text), args.repeat)
+                print('{:8} {:8} {:9.1f} {:12.1f} {:12.1f}'.format(
+                    name, mode, mb, mb / dump, mb / parse))
+    finally:
+        json_codec.name = default
+        json_codec.setCompact(compact)
+
+
+if __name__ == '__main__':
+    main()
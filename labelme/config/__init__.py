@@ -9,17 +9,25 @@ from labelme import logger
 here = osp.dirname(osp.abspath(__file__))
 
 
-def update_dict(target_dict, new_dict, validate_item=None):
+# sections whose keys are not all known beforehand (gdal config options)
+free_form_keys = ['gdal']
+
+
+def update_dict(target_dict, new_dict, validate_item=None, free_form=False):
     for key, value in new_dict.items():
         if validate_item:
             validate_item(key, value)
         if key not in target_dict:
+            if free_form:
+                target_dict[key] = value
+                continue
             logger.warn('Skipping unexpected key in config: {}'
                         .format(key))
             continue
         if isinstance(target_dict[key], dict) and \
                 isinstance(value, dict):
-            update_dict(target_dict[key], value, validate_item=validate_item)
+            update_dict(target_dict[key], value, validate_item=validate_item,
+                        free_form=free_form or key in free_form_keys)
         else:
             target_dict[key] = value
 
@@ -47,6 +55,9 @@ def validate_config_item(key, value):
     if key == 'validate_label' and value not in [None, 'exact', 'instance']:
         raise ValueError('Unexpected value `{}` for key `{}`'
                          .format(value, key))
+    if key == 'label_backend' and value not in ['json', 'sqlite']:
+        raise ValueError('Unexpected value `{}` for key `{}`'
+                         .format(value, key))
 
 
 def get_config(config_from_args=None, config_file=None):
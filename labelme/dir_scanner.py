@@ -0,0 +1,209 @@
+import os
+import os.path as osp
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+# the image formats the plugin opens, also those of the dataset jobs
+imageExtensions = ['img', 'tif', 'tiff', 'png', 'jpg', 'ecw', 'gta', 'pix']
+
+def labelName(name):
+    '''name of the json label file of the image name.'''
+    return osp.splitext(name)[0] + '.json'
+
+
+def hasLabel(name, names):
+    '''
+    whether the label file of the image name is in names, the normcase'd
+    names of a directory listing (a.JSON is the label file of a.tif where
+    the file system ignores case).
+    '''
+    return osp.normcase(labelName(name)) in names
+
+
+def scanImages(root, extensions, listings=None):
+    '''
+    walk root with one os.scandir per directory and yield runs of
+    (image path, labeled) as (dirpath, entries). labeled tells whether the
+    json label file of the image sits in the same listing, so no file is
+    stat'ed on its own. paths use '/' separators.
+
+    the images come in sortKey order, the order of the file list, so it
+    only ever appends them: the images and subdirectories of a directory
+    are walked in the order of their lower case names, a subdirectory
+    counting as its name followed by '/'. a directory's images are thus
+    split in runs around its subdirectories.
+
+    with listings (a dict), every directory walked is recorded in it the
+    way DirWatcher keeps it: dirpath -> (mtime, subdirs, {name: labeled}),
+    so the watcher starts from the scan instead of walking the tree again.
+    '''
+    extensions = tuple(e.lower() for e in extensions)
+    # [dirpath, its images and subdirectories left to walk, run so far]
+    stack = []
+    pending = [root]
+    while pending or stack:
+        if pending:
+            dirpath = pending.pop()
+            try:
+                mtime = os.stat(dirpath).st_mtime \
+                    if listings is not None else 0
+                it = os.scandir(dirpath)
+            except OSError:
+                continue
+            images = []
+            names = set()
+            subdirs = []
+            with it:
+                for entry in it:
+                    try:
+                        isDir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if isDir:
+                        subdirs.append(entry)
+                        continue
+                    names.add(osp.normcase(entry.name))
+                    if entry.name.lower().endswith(extensions):
+                        images.append(entry)
+            if listings is not None:
+                listings[dirpath] = (mtime, set(e.path for e in subdirs), dict(
+                    (entry.name, hasLabel(entry.name, names))
+                    for entry in images))
+            children = [(entry.name.lower(), (
+                entry.path.replace('\\', '/'), hasLabel(entry.name, names)))
+                for entry in images]
+            children.extend((entry.name.lower() + '/', entry.path)
+                            for entry in subdirs)
+            children.sort(key=lambda c: c[0])
+            stack.append([dirpath, iter(children), []])
+            continue
+        frame = stack[-1]
+        child = next(frame[1], None)
+        if child is None:
+            stack.pop()
+            if frame[2]:
+                yield frame[0], frame[2]
+        elif isinstance(child[1], tuple):
+            frame[2].append(child[1])
+        else:
+            # the images before the subdirectory come first
+            if frame[2]:
+                yield frame[0], frame[2]
+                frame[2] = []
+            pending.append(child[1])
+
+
+def scanTileGroups(root, suffixes, depth=None):
+    '''
+    walk root once and yield (dirpath, files) for the directories below it,
+    in the order of os.walk: the subdirectories of a directory one after
+    the other, before those of the deeper levels. files are the files of
+    the whole subtree ending with one of suffixes (case insensitive), in
+    sortKey order; directories without any are skipped. hidden
+    directories (.git, .cache, ...) are not walked, as glob('**') did.
+
+    with depth, only the directories that many levels below root are
+    reported, each as soon as its subtree was walked; the deeper ones are
+    still walked (once). without it a directory is only complete after
+    its subtree, so the groups are yielded once the walk is done.
+    '''
+    suffixes = tuple(s.lower() for s in suffixes)
+    groups = []
+    seq = 0
+    # [dirpath, level, files of the subtree so far, subdirs left to walk,
+    #  (walk order of the parent, position among its siblings), walk order]
+    stack = [[root, 0, [], None, None, seq]]
+    while stack:
+        frame = stack[-1]
+        if frame[3] is None:
+            subdirs = []
+            try:
+                with os.scandir(frame[0]) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir():
+                                if not entry.name.startswith('.'):
+                                    subdirs.append(entry.path)
+                                continue
+                        except OSError:
+                            continue
+                        if entry.name.lower().endswith(suffixes):
+                            frame[2].append(entry.path)
+            except OSError:
+                pass
+            subdirs.sort(key=sortKey)
+            frame[3] = enumerate(subdirs)
+        child = next(frame[3], None)
+        if child is not None:
+            seq += 1
+            stack.append([child[1], frame[1] + 1, [], None,
+                          (frame[5], child[0]), seq])
+            continue
+        stack.pop()
+        dirpath, level, files, _, key = frame[:5]
+        if files and level > 0 and (depth is None or level == depth):
+            group = dirpath, sorted(files, key=sortKey)
+            if depth is None:
+                groups.append((key, group))
+            else:
+                # all on one level: the walk gives them in os.walk order
+                yield group
+        if stack:
+            stack[-1][2].extend(files)
+    groups.sort(key=lambda g: g[0])
+    for _, group in groups:
+        yield group
+
+
+def sortKey(path):
+    '''the order of the file list.'''
+    return path.lower()
+
+
+class ScanThread(QThread):
+    '''
+    scans a directory tree for images in the background. the images are
+    reported in batches through `found` while the scan goes on, `done` is
+    emitted once the whole tree was scanned (not when stopped early);
+    `listings` then holds the directory snapshot for DirWatcher.
+    '''
+
+    found = pyqtSignal(list)
+    done = pyqtSignal(int)
+
+    def __init__(self, root, extensions, batchSize=2000, interval=0.2):
+        QThread.__init__(self)
+        self.root = root
+        self.extensions = extensions
+        self.batchSize = batchSize
+        self.interval = interval
+        self.listings = {}
+        self.stopMe = 0
+
+    def run(self):
+        count = 0
+        batch = []
+        last = time.time()
+        for dirpath, entries in scanImages(self.root, self.extensions,
+                                           self.listings):
+            if self.stopMe:
+                return
+            batch.extend(entries)
+            if len(batch) >= self.batchSize or \
+                    time.time() - last > self.interval:
+                count += len(batch)
+                self.found.emit(batch)
+                batch = []
+                last = time.time()
+        if self.stopMe:
+            return
+        if batch:
+            count += len(batch)
+            self.found.emit(batch)
+        self.done.emit(count)
+
+    def stop(self):
+        self.stopMe = 1
+        self.wait()
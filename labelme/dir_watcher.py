@@ -0,0 +1,224 @@
+import os
+import os.path as osp
+
+from PyQt5.QtCore import QMutex, QThread, QWaitCondition, pyqtSignal
+
+from .dir_scanner import hasLabel
+
+
+def _join(dirpath, name):
+    # the same paths as the scan (dir_scanner.scanImages) reports
+    return osp.join(dirpath, name).replace('\\', '/')
+
+
+def snapshotFiles(dirs):
+    '''the (path, labeled) pairs of the images of a DirWatcher snapshot.'''
+    files = []
+    for dirpath, listing in dirs.items():
+        files.extend((_join(dirpath, name), labeled)
+                     for name, labeled in listing[2].items())
+    return files
+
+
+class DirWatcher(QThread):
+    '''
+    keeps the file list in line with the opened directory after the scan.
+
+    the thread holds a snapshot of every directory below root: its mtime,
+    its subdirectories and its images with their labeled state. a
+    directory is listed again when poke() reports it (the plugin connects
+    a QFileSystemWatcher to it) or, every pollInterval seconds, when its
+    mtime changed, which also catches changes on network drives that
+    QFileSystemWatcher does not see. the differences are reported through
+    `changed` as (added [(path, labeled)], removed [path], labeled
+    [(path, labeled)]); `watch` reports directories to hand to the
+    QFileSystemWatcher.
+
+    the snapshot is built by walking root, or handed in (snapshot, whose
+    files the plugin already shows) from a ScanCache or from the scan that
+    just ran (then unsaved): only the directories whose mtime moved are
+    listed again and the differences are reported like any other change.
+    with cache, the snapshot is saved once complete and, if it changed,
+    when the thread stops. directories are keyed by the paths the scan
+    uses (os.scandir entry paths below root as given).
+    '''
+
+    changed = pyqtSignal(list, list, list)
+    watch = pyqtSignal(list)
+
+    # directories handed to a QFileSystemWatcher at most
+    maxWatched = 4096
+
+    def __init__(self, root, extensions, pollInterval=10, snapshot=None,
+                 cache=None, unsaved=False):
+        QThread.__init__(self)
+        self.root = root
+        self.extensions = tuple(e.lower() for e in extensions)
+        self.pollInterval = pollInterval
+        self.dirs = {}
+        self.snapshot = snapshot
+        self.cache = cache
+        self.dirty = unsaved
+        self.mutex = QMutex()
+        self.wakeUp = QWaitCondition()
+        self.pending = set()
+        self.stopMe = 0
+
+    def _list(self, dirpath):
+        '''(mtime, subdirs, {image name: labeled}) of dirpath, None if gone.'''
+        try:
+            mtime = os.stat(dirpath).st_mtime
+            it = os.scandir(dirpath)
+        except OSError:
+            return None
+        names = set()
+        images = []
+        subdirs = set()
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        subdirs.add(entry.path)
+                        continue
+                except OSError:
+                    continue
+                names.add(osp.normcase(entry.name))
+                if entry.name.lower().endswith(self.extensions):
+                    images.append(entry.name)
+        return mtime, subdirs, dict(
+            (name, hasLabel(name, names)) for name in images)
+
+    def _addTree(self, dirpath, added, newDirs):
+        stack = [dirpath]
+        while stack and not self.stopMe:
+            d = stack.pop()
+            listing = self._list(d)
+            if listing is None:
+                continue
+            self.dirs[d] = listing
+            newDirs.append(d)
+            for name, labeled in listing[2].items():
+                added.append((_join(d, name), labeled))
+            stack.extend(listing[1])
+
+    def _removeTree(self, dirpath, removed):
+        stack = [dirpath]
+        while stack:
+            d = stack.pop()
+            listing = self.dirs.pop(d, None)
+            if listing is None:
+                continue
+            removed.extend(_join(d, name) for name in listing[2])
+            stack.extend(listing[1])
+
+    def _update(self, dirpath, added, removed, labeled, newDirs):
+        old = self.dirs.get(dirpath)
+        if old is None:
+            return
+        new = self._list(dirpath)
+        if new is None:
+            self._removeTree(dirpath, removed)
+            return
+        self.dirs[dirpath] = new
+        oldImages, newImages = old[2], new[2]
+        for name, value in newImages.items():
+            path = _join(dirpath, name)
+            if name not in oldImages:
+                added.append((path, value))
+            elif oldImages[name] != value:
+                labeled.append((path, value))
+        for name in oldImages:
+            if name not in newImages:
+                removed.append(_join(dirpath, name))
+        for d in new[1] - old[1]:
+            if d not in self.dirs:
+                self._addTree(d, added, newDirs)
+        for d in old[1] - new[1]:
+            self._removeTree(d, removed)
+
+    def _changedDirs(self):
+        '''the directories whose mtime moved (or that are gone).'''
+        changed = set()
+        for d, listing in list(self.dirs.items()):
+            try:
+                if os.stat(d).st_mtime != listing[0]:
+                    changed.add(d)
+            except OSError:
+                changed.add(d)
+            if self.stopMe:
+                break
+        return changed
+
+    def _reconcile(self, dirs, missing=()):
+        '''
+        list dirs again, walk the subtrees missing (known subdirectories
+        without a listing), and report what changed.
+        '''
+        added, removed, labeled, newDirs = [], [], [], []
+        for d in dirs:
+            self._update(d, added, removed, labeled, newDirs)
+        for d in missing:
+            if d not in self.dirs:
+                self._addTree(d, added, newDirs)
+        if newDirs:
+            self.watch.emit(newDirs)
+        if added or removed or labeled:
+            self.dirty = True
+            self.changed.emit(added, removed, labeled)
+
+    def _save(self):
+        if self.cache is not None and self.dirty:
+            self.cache.save(self.dirs)
+            self.dirty = False
+
+    def poke(self, dirpath):
+        '''dirpath changed, list it again.'''
+        self.mutex.lock()
+        self.pending.add(dirpath)
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+
+    def run(self):
+        if self.snapshot is not None:
+            self.dirs = self.snapshot
+            self.snapshot = None
+            self.watch.emit(list(self.dirs))
+            # a walk stopped half way leaves subdirectories unlisted
+            missing = set(d for listing in self.dirs.values()
+                          for d in listing[1] if d not in self.dirs)
+            self._reconcile(self._changedDirs(), missing)
+        else:
+            newDirs = []
+            self._addTree(self.root, [], newDirs)
+            self.watch.emit(newDirs)
+            self.dirty = True
+        if self.stopMe:
+            # an incomplete snapshot is not worth keeping
+            return
+        self._save()
+        while True:
+            self.mutex.lock()
+            if not self.pending and not self.stopMe:
+                if self.pollInterval > 0:
+                    self.wakeUp.wait(self.mutex, int(self.pollInterval * 1000))
+                else:
+                    self.wakeUp.wait(self.mutex)
+            if self.stopMe:
+                self.mutex.unlock()
+                self._save()
+                return
+            pending = self.pending
+            self.pending = set()
+            self.mutex.unlock()
+
+            if not pending and self.pollInterval > 0:
+                # poll: directories whose mtime moved
+                pending = self._changedDirs()
+            self._reconcile(pending)
+
+    def stop(self):
+        self.mutex.lock()
+        self.stopMe = 1
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+        self.wait()
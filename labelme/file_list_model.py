@@ -0,0 +1,445 @@
+import bisect
+import os.path as osp
+from array import array
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+
+from .dir_scanner import sortKey
+from .raster_cache import isGeoreferenced
+from .file_search import FileSearchIndex
+from .file_search import matches
+from .file_search import searchTokens
+
+
+class FileList(object):
+    '''
+    read only sequence of the paths of a FileListModel, in row order; this
+    is what LabelmePlugin.imageList returns.
+    '''
+
+    def __init__(self, model):
+        self._model = model
+
+    def __len__(self):
+        return len(self._model._rows)
+
+    def __getitem__(self, row):
+        model = self._model
+        return model._paths[model._rows[row]]
+
+    def __iter__(self):
+        paths = self._model._paths
+        for i in self._model._rows:
+            yield paths[i]
+
+    def __contains__(self, path):
+        return self.find(path) >= 0
+
+    def index(self, path):
+        row = self.find(path)
+        if row < 0:
+            raise ValueError('{} is not in the file list'.format(path))
+        return row
+
+    def find(self, path):
+        '''row of path, -1 if it is not in the list.'''
+        return self._model.rowOf(path)
+
+    def findBasename(self, name):
+        '''first path whose basename is name, None if there is none.'''
+        for path in self:
+            if osp.basename(path) == name:
+                return path
+        return None
+
+
+class _Keys(object):
+    '''the sort keys of an array of ids, for bisect.'''
+
+    def __init__(self, model, ids):
+        self._model = model
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, row):
+        return sortKey(self._model._paths[self._ids[row]])
+
+
+class FileListModel(QtCore.QAbstractTableModel):
+    '''
+    the images of the file dock.
+
+    paths are kept once, in the order they were added, and known by their
+    position in that list (id). `_all` holds the ids of all files in list
+    order and `_rows` the ids of the rows shown: the same array, or the
+    files matching the search when one is set (setSearch). inserting a row
+    only moves machine integers around. the labeled state is one bit per
+    id. rows are only rendered when the view asks for them and switching
+    between full paths and basenames (shortName) is a single dataChanged.
+
+    path -> id is a dict and id -> row an array, so rowOf() is constant
+    time. appending rows keeps the array up to date; an insert in the
+    middle shifts the rows below it, then the array is rebuilt once, on
+    the next lookup. the same goes for id -> position in `_all`, which
+    puts search results in list order.
+
+    a search with more than pageSize hits is paged: `_match` marks the ids
+    that match (1) and those already in `_rows` (2), and fetchMore() walks
+    `_all` on from the last row for the next page, so a broad search on a
+    big list never orders all of its hits at once. the view fetches as it
+    scrolls down.
+
+    the size and georeferenced columns come from the image headers: when
+    a row is rendered before its header was read the model asks
+    metaRequest(path) for it (MetaThread) and shows the value when
+    setMeta() hands it in.
+    '''
+
+    headers = ['文件', '大小', '地理参考']
+    pageSize = 1000
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.shortName = False
+        self.metaRequest = None
+        self.files = FileList(self)
+        self.searchIndex = FileSearchIndex()
+        self._tokens = []
+        self._reset()
+
+    def _reset(self):
+        self._paths = []
+        self._ids = {}
+        self._all = array('l')
+        self._rows = array('l') if self._tokens else self._all
+        self._rowOfId = array('l')
+        self._rowsDirty = False
+        self._posOfId = array('l')
+        self._posDirty = False
+        self._labeled = bytearray()
+        self._match = None
+        self._more = False
+        # id -> (width, height, georeferenced), None if it cannot be read
+        self._meta = {}
+        self.searchIndex.clear()
+
+    # QAbstractTableModel
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        i = self._rows[index.row()]
+        column = index.column()
+        if column > 0:
+            if role == Qt.DisplayRole:
+                return self._metaText(i, column)
+            return None
+        if role == Qt.DisplayRole:
+            path = self._paths[i]
+            return osp.basename(path) if self.shortName else path
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if self._getLabeled(i) else Qt.Unchecked
+        if role == Qt.ToolTipRole:
+            return self._paths[i]
+        return None
+
+    def _metaText(self, i, column):
+        if i not in self._meta:
+            if self.metaRequest is not None:
+                self.metaRequest(self._paths[i])
+            return ''
+        meta = self._meta[i]
+        if meta is None:
+            return '-'
+        if column == 1:
+            return '{} x {}'.format(meta[0], meta[1])
+        return '是' if meta[2] else '否'
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    # labeled bitset
+    def _getLabeled(self, i):
+        return bool(self._labeled[i >> 3] & (1 << (i & 7)))
+
+    def _setLabeled(self, i, value):
+        if value:
+            self._labeled[i >> 3] |= 1 << (i & 7)
+        else:
+            self._labeled[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def _addPath(self, path, labeled):
+        i = len(self._paths)
+        self._paths.append(path)
+        self._ids[path] = i
+        self._rowOfId.append(-1)
+        self._posOfId.append(-1)
+        if len(self._labeled) * 8 <= i:
+            self._labeled.append(0)
+        self._setLabeled(i, labeled)
+        return i
+
+    def clear(self):
+        '''drop all files; the search stays set for the files added next.'''
+        self.beginResetModel()
+        self._reset()
+        self.endResetModel()
+
+    def isFiltered(self):
+        return self._rows is not self._all
+
+    def _insertSorted(self, ids, new, signal):
+        '''
+        insert the ids new (sorted) into the sorted array ids, with row
+        insert signals if signal. return whether they were all appended.
+        '''
+        keys = _Keys(self, ids)
+        n = len(ids)
+        parent = QtCore.QModelIndex()
+        if n == 0 or keys[n - 1] <= sortKey(self._paths[new[0]]):
+            # the common case: the batch goes after the last row
+            if signal:
+                self.beginInsertRows(parent, n, n + len(new) - 1)
+            ids.extend(new)
+            if signal:
+                self.endInsertRows()
+            return True
+        for i in new:
+            row = bisect.bisect_right(keys, sortKey(self._paths[i]))
+            if signal:
+                self.beginInsertRows(parent, row, row)
+            ids.insert(row, i)
+            if signal:
+                self.endInsertRows()
+        return False
+
+    def addFiles(self, entries):
+        '''
+        insert (path, labeled) pairs at their sorted position; paths already
+        in the list are skipped.
+        '''
+        entries = sorted((e for e in entries if e[0] not in self._ids),
+                         key=lambda e: sortKey(e[0]))
+        if not entries:
+            return
+        new = array('l', (self._addPath(path, labeled)
+                          for path, labeled in entries))
+        # index while the scan goes on, the first search is then instant
+        self.searchIndex.update(self._paths)
+        filtered = self.isFiltered()
+        n = len(self._all)
+        appended = self._insertSorted(self._all, new, not filtered)
+        if appended and not self._posDirty:
+            for pos, i in enumerate(new, n):
+                self._posOfId[i] = pos
+        else:
+            self._posDirty = True
+        if filtered:
+            shown = array('l', (i for i in new
+                                if matches(self._paths[i], self._tokens)))
+            if self._match is not None:
+                shown = self._addMatches(shown)
+            if not shown:
+                return
+            n = len(self._rows)
+            appended = self._insertSorted(self._rows, shown, True)
+        else:
+            shown = new
+        if appended and not self._rowsDirty:
+            for row, i in enumerate(shown, n):
+                self._rowOfId[i] = row
+        else:
+            self._rowsDirty = True
+
+    def _addMatches(self, ids):
+        '''
+        mark the new matching ids in `_match` and return those to show now:
+        the ones after the last row of a paged search come with fetchMore.
+        '''
+        match = self._match
+        match.extend(bytes(len(self._paths) - len(match)))
+        if self._more and self._rows:
+            lastKey = sortKey(self._paths[self._rows[-1]])
+            later = [i for i in ids if sortKey(self._paths[i]) > lastKey]
+            for i in later:
+                match[i] = 1
+            ids = array('l', (i for i in ids if match[i] != 1))
+        for i in ids:
+            match[i] = 2
+        return ids
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self._more
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        '''append the next page of a paged search to the rows.'''
+        if not self.canFetchMore(parent):
+            return
+        match = self._match
+        start = 0
+        if self._rows:
+            start = bisect.bisect_left(
+                _Keys(self, self._all), sortKey(self._paths[self._rows[-1]]))
+        page = array('l')
+        allIds = self._all
+        for pos in range(start, len(allIds)):
+            i = allIds[pos]
+            if match[i] == 1:
+                match[i] = 2
+                page.append(i)
+                if len(page) == self.pageSize:
+                    break
+        else:
+            self._more = False
+        if not page:
+            return
+        n = len(self._rows)
+        self.beginInsertRows(parent, n, n + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+        if not self._rowsDirty:
+            for row, i in enumerate(page, n):
+                self._rowOfId[i] = row
+
+    def _updateRowIndex(self):
+        rowOfId = array('l', [-1]) * len(self._paths)
+        for row, i in enumerate(self._rows):
+            rowOfId[i] = row
+        self._rowOfId = rowOfId
+        self._rowsDirty = False
+
+    def _updatePosIndex(self):
+        posOfId = array('l', [-1]) * len(self._paths)
+        for pos, i in enumerate(self._all):
+            posOfId[i] = pos
+        self._posOfId = posOfId
+        self._posDirty = False
+
+    def rowOf(self, path):
+        '''row of path, -1 if it is not in the list.'''
+        i = self._ids.get(path)
+        if i is None:
+            return -1
+        if self._rowsDirty:
+            self._updateRowIndex()
+        return self._rowOfId[i]
+
+    def setSearch(self, text):
+        '''show only the files matching text (see file_search), all if empty.'''
+        tokens = searchTokens(text)
+        if tokens == self._tokens:
+            return
+        self.beginResetModel()
+        self._tokens = tokens
+        self._match = None
+        self._more = False
+        if not tokens:
+            self._rows = self._all
+        else:
+            ids = [i for i in self.searchIndex.query(text, self._paths)
+                   if self._paths[i] is not None]
+            if len(ids) <= self.pageSize:
+                if self._posDirty:
+                    self._updatePosIndex()
+                ids.sort(key=self._posOfId.__getitem__)
+                self._rows = array('l', ids)
+            else:
+                # in list order, a page at a time (fetchMore)
+                self._match = bytearray(len(self._paths))
+                for i in ids:
+                    self._match[i] = 1
+                self._rows = array('l')
+                self._more = True
+        self._rowsDirty = True
+        self.endResetModel()
+        if self._more:
+            self.fetchMore()
+
+    def removeFiles(self, paths):
+        '''remove paths from the list; their ids are not reused.'''
+        ids = [self._ids.pop(path) for path in paths if path in self._ids]
+        if not ids:
+            return
+        if self._rowsDirty:
+            self._updateRowIndex()
+        if self._posDirty:
+            self._updatePosIndex()
+        if self.isFiltered():
+            positions = sorted((self._posOfId[i] for i in ids), reverse=True)
+            for pos in positions:
+                del self._all[pos]
+        rows = sorted((self._rowOfId[i] for i in ids if self._rowOfId[i] >= 0),
+                      reverse=True)
+        parent = QtCore.QModelIndex()
+        for row in rows:
+            self.beginRemoveRows(parent, row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+        for i in ids:
+            self._paths[i] = None
+        self._rowsDirty = True
+        self._posDirty = True
+
+    def isLabeled(self, row):
+        return self._getLabeled(self._rows[row])
+
+    def setLabeledPath(self, path, value):
+        '''setLabeled by path, also for files hidden by the search.'''
+        i = self._ids.get(path)
+        if i is None:
+            return
+        row = self.rowOf(path)
+        if row >= 0:
+            self.setLabeled(row, value)
+        else:
+            self._setLabeled(i, value)
+
+    def setLabeled(self, row, value):
+        i = self._rows[row]
+        if self._getLabeled(i) == bool(value):
+            return
+        self._setLabeled(i, value)
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+
+    def setMeta(self, entries):
+        '''(path, raster_cache.rasterMeta entry) pairs, see MetaThread.'''
+        rows = []
+        for path, entry in entries:
+            i = self._ids.get(path)
+            if i is None:
+                continue
+            self._meta[i] = None if entry is None else (
+                entry['width'], entry['height'], isGeoreferenced(entry))
+            row = self.rowOf(path)
+            if row >= 0:
+                rows.append(row)
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 1),
+                                  self.index(max(rows), 2), [Qt.DisplayRole])
+
+    def setShortName(self, value):
+        if self.shortName == value:
+            return
+        self.shortName = value
+        if self._rows:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(len(self._rows) - 1, 0),
+                [Qt.DisplayRole])
@@ -0,0 +1,103 @@
+import os.path as osp
+from array import array
+
+
+def searchTokens(text):
+    return text.lower().split()
+
+
+def matches(path, tokens):
+    '''
+    whether path matches every token: a token is a case insensitive
+    substring of the basename, or of the whole path if it holds a separator.
+    '''
+    path = path.replace('\\', '/').lower()
+    name = path.rsplit('/', 1)[-1]
+    for token in tokens:
+        if '/' in token or '\\' in token:
+            if token.replace('\\', '/') not in path:
+                return False
+        elif token not in name:
+            return False
+    return True
+
+
+class FileSearchIndex(object):
+    '''
+    trigram index over the lower case basenames of the file list, used by
+    the search box of the file dock.
+
+    files are known by the id the FileListModel gave them (their position
+    in its path list). update() indexes the files added since the last
+    call, so posting lists stay sorted. a token of three or more
+    characters only verifies the files of its rarest trigram; shorter
+    tokens, and tokens holding a path separator, scan all names.
+    '''
+
+    n = 3
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._names = []
+        self._grams = {}
+
+    def update(self, paths):
+        '''index paths[len(indexed):], paths being the id -> path list.'''
+        names = self._names
+        grams = self._grams
+        n = self.n
+        for i in range(len(names), len(paths)):
+            # removed files are None
+            name = osp.basename((paths[i] or '').replace('\\', '/')).lower()
+            names.append(name)
+            for gram in set(name[j:j + n] for j in range(len(name) - n + 1)):
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array('l')
+                posting.append(i)
+
+    def _candidates(self, token):
+        '''ids of the names that may contain token, None if unknown.'''
+        n = self.n
+        if len(token) < n or '/' in token or '\\' in token:
+            return None
+        best = None
+        for j in range(len(token) - n + 1):
+            posting = self._grams.get(token[j:j + n])
+            if posting is None:
+                return array('l')
+            if best is None or len(posting) < len(best):
+                best = posting
+        return best
+
+    def query(self, text, paths):
+        '''ids of the files matching every token of text, in id order.'''
+        self.update(paths)
+        tokens = searchTokens(text)
+        if not tokens:
+            return list(range(len(self._names)))
+        # start from the token with the fewest candidates
+        best = None
+        for token in tokens:
+            candidates = self._candidates(token)
+            if candidates is not None and \
+                    (best is None or len(candidates) < len(best[1])):
+                best = (token, candidates)
+        names = self._names
+        if best is None:
+            ids = range(len(names))
+        else:
+            ids = best[1]
+        for token in tokens:
+            if best is not None and token == best[0]:
+                ids = [i for i in ids if token in names[i]]
+                best = None
+            elif '/' in token or '\\' in token:
+                token = token.replace('\\', '/')
+                ids = [i for i in ids if paths[i] is not None and
+                       token in paths[i].replace('\\', '/').lower()]
+            else:
+                ids = [i for i in ids if token in names[i]]
+        return list(ids)
@@ -0,0 +1,77 @@
+import collections
+import os
+import os.path as osp
+import threading
+
+import gdal
+
+
+class DatasetPool(object):
+    '''
+    read only gdal datasets kept open for reuse, so the header of an image
+    is parsed (and its block cache warmed up) once, not by every reader.
+
+    gdal datasets must not be used by two threads at once, so a dataset is
+    only handed out again to the thread that opened it. all threads share
+    one pool of at most maxOpen datasets, least recently used first out,
+    behind `lock`. a dataset is reopened when the size or mtime of its file
+    changed. the datasets handed out are shared: do not close them, call
+    release() before the file is rewritten or deleted and clear() when
+    the files are not needed any more (an open dataset locks the file on
+    windows); both reach the datasets of every thread. a thread still
+    reading one keeps it open until it lets go of it.
+    '''
+
+    def __init__(self, maxOpen=32):
+        self.maxOpen = maxOpen
+        self.lock = threading.Lock()
+        # (thread, path key) -> (stamp, dataset)
+        self.datasets = collections.OrderedDict()
+
+    @staticmethod
+    def _key(path):
+        return osp.normcase(osp.abspath(path))
+
+    def open(self, path):
+        '''the shared read only dataset of path, None if gdal cannot open it.'''
+        try:
+            st = os.stat(path)
+        except OSError:
+            # not a local file (/vsicurl/, ...): no stamp to check
+            st = None
+        stamp = (st.st_size, st.st_mtime) if st is not None else None
+        key = (threading.get_ident(), self._key(path))
+        with self.lock:
+            entry = self.datasets.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.datasets.move_to_end(key)
+                return entry[1]
+            self.datasets.pop(key, None)
+        # opening may take long, other threads go on meanwhile
+        ds = gdal.Open(path, gdal.GA_ReadOnly)
+        if ds is None:
+            return None
+        with self.lock:
+            self.datasets[key] = (stamp, ds)
+            while len(self.datasets) > self.maxOpen:
+                self.datasets.popitem(last=False)
+        return ds
+
+    def release(self, path):
+        '''close the datasets of path, in all threads.'''
+        path = self._key(path)
+        with self.lock:
+            for key in [key for key in self.datasets if key[1] == path]:
+                del self.datasets[key]
+
+    def clear(self):
+        '''close all datasets, in all threads.'''
+        with self.lock:
+            self.datasets.clear()
+
+
+pool = DatasetPool()
+
+
+def openDataset(path):
+    return pool.open(path)
@@ -0,0 +1,126 @@
+import contextlib
+import os
+import threading
+
+import gdal
+
+
+# the gdal section of the config: preset name -> {option: value}
+profiles = {}
+# not a gdal config option: the memory of a warp (gdal2tiles), in MB; it
+# is passed on in the environment as warpMemoryEnv
+warpMemoryKey = 'warp_memory_mb'
+warpMemoryEnv = 'RSLABEL_WARP_MEMORY_MB'
+# read by gdal only when the block cache is set up (before the plugin is
+# loaded), so it is set with SetCacheMax
+cacheMaxKey = 'GDAL_CACHEMAX'
+
+# gdalProfile jobs running, in the order they started: (token, name)
+_active = []
+# option -> its value before the first of the running jobs
+_base = {}
+_lock = threading.Lock()
+
+
+def setProfiles(config):
+    global profiles
+    profiles = dict(config or {})
+
+
+def _cacheBytes(value):
+    '''a GDAL_CACHEMAX value (MB, bytes or a percentage of RAM) in bytes.'''
+    value = value.strip()
+    if value.endswith('%'):
+        return int(gdal.GetUsablePhysicalRAM() * float(value[:-1]) / 100)
+    size = int(float(value))
+    # like gdal: small values are MB
+    return size * 1024 * 1024 if size < 100000 else size
+
+
+def _get(key):
+    if key == warpMemoryKey:
+        return os.environ.get(warpMemoryEnv)
+    if key == cacheMaxKey:
+        return str(gdal.GetCacheMax() // (1024 * 1024))
+    return gdal.GetConfigOption(key)
+
+
+def _set(key, value):
+    if key == warpMemoryKey:
+        key = warpMemoryEnv
+    elif key == cacheMaxKey:
+        if value is not None:
+            gdal.SetCacheMax(_cacheBytes(value))
+    else:
+        gdal.SetConfigOption(key, value)
+    # worker processes (tiling) read the options from their environment
+    if value is None:
+        os.environ.pop(key, None)
+    else:
+        os.environ[key] = value
+
+
+def applyProfile(name):
+    '''
+    set the gdal config options of the preset name for good (the
+    interactive preset at startup).
+    '''
+    with _lock:
+        for key, value in (profiles.get(name) or {}).items():
+            value = None if value is None else str(value)
+            if _active:
+                # the value to go back to once the running jobs are done
+                _base[key] = value
+            else:
+                _set(key, value)
+
+
+def _reapply():
+    '''
+    set the options of the running jobs over the values they replaced; the
+    job started last wins where two presets set the same option.
+    '''
+    values = dict(_base)
+    for token, name in _active:
+        for key, value in (profiles.get(name) or {}).items():
+            values[key] = None if value is None else str(value)
+    for key, value in values.items():
+        if _get(key) != value:
+            _set(key, value)
+
+
+@contextlib.contextmanager
+def gdalProfile(name):
+    '''
+    the preset name (export, tiling, ...) for the time of a long job.
+
+    the options are process-wide and jobs overlap (tiling runs in a
+    thread while the gui exports), so a job does not put back what it saw
+    on entry: the values from before the first job are kept and every
+    exit sets them again, under the options of the jobs still running.
+    '''
+    token = object()
+    with _lock:
+        if not _active:
+            _base.clear()
+        for key in (profiles.get(name) or {}):
+            if key not in _base:
+                _base[key] = _get(key)
+        _active.append((token, name))
+        _reapply()
+    try:
+        yield
+    finally:
+        with _lock:
+            _active[:] = [job for job in _active if job[0] is not token]
+            _reapply()
+            if not _active:
+                _base.clear()
+
+
+def warpMemoryLimit():
+    '''the warp memory of the current preset in bytes, None for the default.'''
+    value = os.environ.get(warpMemoryEnv)
+    if not value:
+        return None
+    return int(float(value) * 1024 * 1024)
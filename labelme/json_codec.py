@@ -0,0 +1,75 @@
+'''
+the json codec of label files, indexes, journals and exports.
+
+uses orjson or ujson when one of them is installed and the standard json
+module otherwise. the text is the same with every backend (utf-8, non
+ascii characters kept), so files written by one are read by the others.
+with `compact` set, dump()/dumps() ignore indent and write no whitespace,
+which makes large label files much smaller and faster to write.
+'''
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+if orjson is not None:
+    name = 'orjson'
+elif ujson is not None:
+    name = 'ujson'
+else:
+    name = 'json'
+
+compact = False
+
+
+def setCompact(value):
+    global compact
+    compact = bool(value)
+
+
+def _stdDumps(obj, indent):
+    if indent is None:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+
+def dumps(obj, indent=None):
+    if compact:
+        indent = None
+    try:
+        if name == 'orjson':
+            if indent is None:
+                return orjson.dumps(obj).decode('utf-8')
+            if indent == 2:
+                return orjson.dumps(
+                    obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+        elif name == 'ujson':
+            return ujson.dumps(obj, ensure_ascii=False, indent=indent or 0,
+                               escape_forward_slashes=False)
+    except (TypeError, OverflowError):
+        # numpy scalars, non string keys, ...: the stdlib copes
+        pass
+    return _stdDumps(obj, indent)
+
+
+def dump(obj, f, indent=None):
+    f.write(dumps(obj, indent))
+
+
+def loads(s):
+    if name == 'orjson':
+        return orjson.loads(s)
+    if name == 'ujson':
+        return ujson.loads(s)
+    return json.loads(s)
+
+
+def load(f):
+    return loads(f.read())
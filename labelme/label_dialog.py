@@ -101,6 +101,17 @@ class LabelDialog(QtWidgets.QDialog):
         if self._sort_labels:
             self.labelList.sortItems()
 
+    def addLabelsHistory(self, labels):
+        '''addLabelHistory for many labels, sorting once.'''
+        known = set(self.labelList.item(i).text()
+                    for i in range(self.labelList.count()))
+        new = [label for label in labels if label not in known]
+        if not new:
+            return
+        self.labelList.addItems(new)
+        if self._sort_labels:
+            self.labelList.sortItems()
+
     def labelSelected(self, item):
         self.edit.setText(item.text())
 
@@ -1,7 +1,11 @@
 import base64
-import json
 import os.path
+import stat
+import tempfile
 
+import numpy as np
+
+from . import json_codec
 from . import logger
 from . import utils
 
@@ -10,19 +14,141 @@ class LabelFileError(Exception):
     pass
 
 
+def writeAtomic(filename, write, mode='w'):
+    '''
+    call write(f) on a temp file next to filename and rename it over
+    filename, so a crash or a full disk never leaves a half written file.
+    the file keeps its permissions (new files get the umask default).
+    '''
+    fd, tmp = tempfile.mkstemp(
+        suffix='.tmp', dir=os.path.dirname(filename) or None)
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp, _fileMode(filename))
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# read once: os.umask can only be read by setting it, which is not
+# thread safe (the save thread writes files too)
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def _fileMode(filename):
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        return 0o666 & ~_umask
+
+
+def pointsFileName(filename):
+    '''the binary points sidecar of the label file filename.'''
+    return os.path.splitext(filename)[0] + '.points.npz'
+
+
+def savePoints(path, pointLists):
+    '''
+    write the points of all shapes as one float64 (n, 2) coordinate buffer
+    plus the offsets of every shape in it.
+    '''
+    offsets = np.zeros(len(pointLists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(points) for points in pointLists])
+    coords = np.empty((offsets[-1], 2), dtype=np.float64)
+    for i, points in enumerate(pointLists):
+        if len(points):
+            coords[offsets[i]:offsets[i + 1]] = points
+    writeAtomic(path, lambda f: np.savez(f, coords=coords, offsets=offsets),
+                mode='wb')
+
+
+def loadPoints(path):
+    '''inverse of savePoints: a list of [[x, y], ...] lists, one per shape.'''
+    with np.load(path) as npz:
+        coords = npz['coords'].tolist()
+        offsets = npz['offsets'].tolist()
+    return [coords[offsets[i]:offsets[i + 1]]
+            for i in range(len(offsets) - 1)]
+
+
+class LazyImageData(object):
+    '''
+    image bytes of a label file, read from disk (or decoded from the embedded
+    base64 string) only the first time somebody asks for them.
+    '''
+
+    def __init__(self, path=None, encoded=None):
+        self.path = path
+        self.encoded = encoded
+        self._data = None
+
+    def isLoaded(self):
+        return self._data is not None
+
+    def read(self):
+        if self._data is None:
+            if self.encoded is not None:
+                self._data = base64.b64decode(self.encoded)
+                self.encoded = None
+            else:
+                with open(self.path, 'rb') as f:
+                    self._data = f.read()
+        return self._data
+
+
+# the keys of a json shape held by the fields of a ShapeTuple
+shapeKeys = ('label', 'points', 'line_color', 'fill_color', 'shape_type',
+             'probability')
+
+
+class ShapeTuple(tuple):
+    '''
+    a shape of LabelFile.shapes: (label, points, line_color, fill_color,
+    shape_type, probability). `other` holds the other keys of its json dict
+    (group_id, flags, ...) so they are written back, None if there are none.
+    '''
+
+    other = None
+
+
 class LabelFile(object):
 
     suffix = '.json'
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, loadImageData=True):
         self.shapes = ()
         self.imagePath = None
         self.imageData = None
+        self.imageHeight = None
+        self.imageWidth = None
         if filename is not None:
-            self.load(filename)
+            self.load(filename, loadImageData=loadImageData)
         self.filename = filename
 
-    def load(self, filename):
+    @property
+    def imageData(self):
+        if isinstance(self._imageData, LazyImageData):
+            try:
+                return self._imageData.read()
+            except Exception as e:
+                raise LabelFileError(e)
+        return self._imageData
+
+    @imageData.setter
+    def imageData(self, value):
+        self._imageData = value
+
+    def load(self, filename, loadImageData=True):
+        '''
+        load the label file. the image bytes are never read here: with
+        loadImageData the imageData attribute reads them on first access,
+        without it (metadata only) imageData stays None.
+        '''
         keys = [
             'imageData',
             'imagePath',
@@ -32,33 +158,35 @@ class LabelFile(object):
             'flags',   # image level flags
             'imageHeight',
             'imageWidth',
+            'pointsFile',  # binary points sidecar, see savePoints
         ]
         try:
             with open(filename, 'r') as f:
-                data = json.load(f)
-            if data['imageData'] is not None:
-                imageData = base64.b64decode(data['imageData'])
+                data = json_codec.load(f)
+            if not loadImageData:
+                imageData = None
+            elif data['imageData'] is not None:
+                imageData = LazyImageData(encoded=data['imageData'])
             else:
                 # relative path from label file to relative path from cwd
-                imagePath = os.path.join(os.path.dirname(filename),
-                                         data['imagePath'])
-                with open(imagePath, 'rb') as f:
-                    imageData = f.read()
+                imageData = LazyImageData(path=os.path.join(
+                    os.path.dirname(filename), data['imagePath']))
             flags = data.get('flags')
             imagePath = data['imagePath']
             lineColor = data['lineColor']
             fillColor = data['fillColor']
-            shapes = (
-                (
-                    s['label'],
-                    s['points'],
-                    s['line_color'],
-                    s['fill_color'],
-                    s.get('shape_type', 'polygon'),
-                    s['probability'],
-                )
-                for s in data['shapes']
-            )
+            imageHeight = data.get('imageHeight')
+            imageWidth = data.get('imageWidth')
+            if data.get('pointsFile'):
+                pointLists = loadPoints(os.path.join(
+                    os.path.dirname(filename), data['pointsFile']))
+                if len(pointLists) != len(data['shapes']):
+                    raise ValueError(
+                        '{} does not match the shapes of the label file'
+                        .format(data['pointsFile']))
+                for s, points in zip(data['shapes'], pointLists):
+                    s['points'] = points
+            shapes = [self.shapeTuple(s) for s in data['shapes']]
         except Exception as e:
             raise LabelFileError(e)
 
@@ -74,6 +202,8 @@ class LabelFile(object):
         self.imageData = imageData
         self.lineColor = lineColor
         self.fillColor = fillColor
+        self.imageHeight = imageHeight
+        self.imageWidth = imageWidth
         self.filename = filename
         self.otherData = otherData
 
@@ -106,7 +236,12 @@ class LabelFile(object):
         fillColor=None,
         otherData=None,
         flags=None,
+        binaryPoints=False,
     ):
+        '''
+        with binaryPoints the points go to a .points.npz sidecar (see
+        savePoints) and the json only keeps the rest of the shapes.
+        '''
         '''
         if imageData is not None:
             imageData = base64.b64encode(imageData).decode('utf-8')
@@ -131,13 +266,64 @@ class LabelFile(object):
         )
         for key, value in otherData.items():
             data[key] = value
+        pointsFile = pointsFileName(filename)
         try:
-            with open(filename, 'w') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            if binaryPoints:
+                # the sidecar first: the json pointing to it is only
+                # replaced once the points are on disk
+                savePoints(pointsFile, [s['points'] for s in shapes])
+                data['shapes'] = [dict(s, points=None) for s in shapes]
+                data['pointsFile'] = os.path.basename(pointsFile)
+            writeAtomic(filename, lambda f: json_codec.dump(
+                data, f, indent=2))
+            if not binaryPoints and os.path.exists(pointsFile):
+                os.remove(pointsFile)
             self.filename = filename
         except Exception as e:
             raise LabelFileError(e)
 
+    @staticmethod
+    def shapeTuple(s, other=None):
+        '''
+        the shape tuple of the json shape dict s; the keys besides shapeKeys
+        go to `other`, or other is taken as it is.
+        '''
+        shape = ShapeTuple((
+            s['label'],
+            s['points'],
+            s['line_color'],
+            s['fill_color'],
+            s.get('shape_type', 'polygon'),
+            s['probability'],
+        ))
+        if other is None:
+            other = dict((key, value) for key, value in s.items()
+                         if key not in shapeKeys)
+        if other:
+            shape.other = other
+        return shape
+
+    @staticmethod
+    def shapeDict(label, points, line_color, fill_color, shape_type,
+                  probability, other=None):
+        '''turn the fields of a shape tuple back into its json dict.'''
+        shape = dict(
+            label=label,
+            line_color=line_color,
+            fill_color=fill_color,
+            points=points,
+            probability=probability,
+            shape_type=shape_type,
+        )
+        if other:
+            shape.update(other)
+        return shape
+
+    @staticmethod
+    def shapeDictOf(shape):
+        '''the json dict of a shape of `shapes`, with its other keys.'''
+        return LabelFile.shapeDict(*shape, other=getattr(shape, 'other', None))
+
     @staticmethod
     def isLabelFile(filename):
         return os.path.splitext(filename)[1].lower() == LabelFile.suffix
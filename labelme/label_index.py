@@ -0,0 +1,190 @@
+import hashlib
+import os
+import os.path as osp
+import threading
+
+from . import json_codec
+from . import logger
+from .label_file import LabelFile
+from .label_file import LabelFileError
+from .label_file import writeAtomic
+
+
+class LabelIndex(object):
+    '''
+    on-disk summary of the label files below a directory: label set, shape
+    count, bounding box (map coordinates) and geoTrans of every file.
+
+    entries are keyed by the path relative to the root and carry the mtime
+    and size of the file they were built from, so update() only re-parses
+    the files that changed since the last run. the label store updates
+    the index from the save thread, so entries are only touched under
+    `lock`.
+
+    like ScanCache the indexes live outside the datasets, one file per root
+    in indexDir(): a write into the root would move its mtime, and the
+    dataset may be read only.
+    '''
+
+    version = 1
+
+    def __init__(self, root, indexPath=None):
+        self.root = root
+        if indexPath is None:
+            indexPath = osp.join(self.indexDir(), '{}.json'.format(
+                hashlib.sha1(osp.normcase(osp.abspath(root))
+                             .encode('utf-8')).hexdigest()))
+        self.indexPath = indexPath
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.RLock()
+        self.load()
+
+    @staticmethod
+    def indexDir():
+        return osp.join(osp.expanduser('~'), '.rslabel', 'label_index')
+
+    def _key(self, path):
+        return osp.relpath(path, self.root).replace('\\', '/')
+
+    def _path(self, key):
+        return osp.join(self.root, key).replace('\\', '/')
+
+    def load(self):
+        if not osp.exists(self.indexPath):
+            return
+        try:
+            with open(self.indexPath, 'r') as f:
+                data = json_codec.load(f)
+            if data.get('version') == self.version and \
+                    osp.normpath(data.get('root', '')) == \
+                    osp.normpath(self.root):
+                self.entries = data['entries']
+        except Exception as e:
+            logger.warn('Ignoring broken label index {}: {}'
+                        .format(self.indexPath, e))
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = dict(version=self.version, root=self.root,
+                        entries=self.entries)
+            try:
+                if not osp.exists(osp.dirname(self.indexPath)):
+                    os.makedirs(osp.dirname(self.indexPath))
+                writeAtomic(self.indexPath,
+                            lambda f: json_codec.dump(data, f))
+                self.dirty = False
+            except Exception as e:
+                logger.warn('Failed to save label index {}: {}'
+                            .format(self.indexPath, e))
+
+    @staticmethod
+    def summarize(shapes, geoTrans=None, imagePath=None):
+        '''summary entry of a list of (label, points) pairs.'''
+        labels = set()
+        count = 0
+        xmin = ymin = float('inf')
+        xmax = ymax = float('-inf')
+        for label, points in shapes:
+            labels.add(label)
+            count += 1
+            for x, y in points:
+                xmin = min(xmin, x)
+                ymin = min(ymin, y)
+                xmax = max(xmax, x)
+                ymax = max(ymax, y)
+        bbox = [xmin, ymin, xmax, ymax] if xmin <= xmax else None
+        return dict(
+            labels=sorted(labels),
+            shapeCount=count,
+            bbox=bbox,
+            geoTrans=list(geoTrans) if geoTrans is not None else None,
+            imagePath=imagePath,
+        )
+
+    def _parse(self, path, st):
+        try:
+            lf = LabelFile(path, loadImageData=False)
+        except LabelFileError as e:
+            logger.warn('Not a label file {}: {}'.format(path, e))
+            entry = dict(valid=False)
+        else:
+            entry = self.summarize(
+                ((s[0], s[1]) for s in lf.shapes),
+                lf.otherData.get('geoTrans'),
+                lf.imagePath,
+            )
+            entry['valid'] = True
+        entry['mtime'] = st.st_mtime
+        entry['size'] = st.st_size
+        return entry
+
+    def update(self):
+        '''
+        bring the index in line with the tree: stat every label file and
+        re-parse only the new or modified ones. return the number of
+        re-parsed files.
+        '''
+        with self.lock:
+            return self._update()
+
+    def _update(self):
+        entries = {}
+        parsed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # same files as glob('**/*.json'), which skips hidden entries
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for f in filenames:
+                if f.startswith('.') or not LabelFile.isLabelFile(f):
+                    continue
+                path = osp.join(dirpath, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                key = self._key(path)
+                entry = self.entries.get(key)
+                if entry is None or entry['mtime'] != st.st_mtime or \
+                        entry['size'] != st.st_size:
+                    entry = self._parse(path, st)
+                    parsed += 1
+                entries[key] = entry
+        if parsed or len(entries) != len(self.entries):
+            self.dirty = True
+        self.entries = entries
+        self.save()
+        return parsed
+
+    def put(self, path, shapes, geoTrans=None, imagePath=None):
+        '''record a label file that was just written from `shapes`.'''
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        entry = self.summarize(shapes, geoTrans, imagePath)
+        entry['valid'] = True
+        entry['mtime'] = st.st_mtime
+        entry['size'] = st.st_size
+        with self.lock:
+            self.entries[self._key(path)] = entry
+            self.dirty = True
+
+    def get(self, path):
+        with self.lock:
+            return self.entries.get(self._key(path))
+
+    def labelFiles(self):
+        with self.lock:
+            return sorted(self._path(key)
+                          for key, entry in self.entries.items()
+                          if entry['valid'])
+
+    def labels(self):
+        labels = set()
+        with self.lock:
+            for entry in self.entries.values():
+                if entry['valid']:
+                    labels.update(entry['labels'])
+        return labels
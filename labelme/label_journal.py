@@ -0,0 +1,143 @@
+import os
+import os.path as osp
+
+from . import json_codec
+from . import logger
+from .label_file import LabelFile
+
+
+class LabelJournal(object):
+    '''
+    append-only log of the edits made to a label file since it was last
+    written, kept next to it as <label file>.journal, one json record per
+    line.
+
+    the first record ('base') stores the header of the label file, the
+    mtime/size of the json the edits apply to and the ids of its shapes;
+    shapes are then referred to by id. the other records are 'put' (add or
+    replace a shape), 'del', 'order' and 'meta' (flags and colors).
+
+    the label file is written by the save thread while editing goes on: a
+    'rebase' record marks that the json now holds the shapes `ids`, and
+    only the records after it still have to be applied. replay() rebuilds
+    the shapes after a crash; once the label file is rewritten with no
+    edits in between the journal is discarded.
+    '''
+
+    suffix = '.journal'
+
+    def __init__(self, labelPath):
+        self.labelPath = labelPath
+        self.path = labelPath + self.suffix
+        self._f = None
+        self.count = 0
+
+    def exists(self):
+        return osp.exists(self.path)
+
+    def isOpen(self):
+        return self._f is not None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.labelPath)
+            return [st.st_mtime, st.st_size]
+        except OSError:
+            return None
+
+    def open(self, header, ids):
+        '''
+        start a new journal on top of the label file as it is now, ids being
+        the ids of its shapes.
+        '''
+        self.close()
+        self._f = open(self.path, 'w')
+        self.count = 0
+        self.append('base', file=self._stat(), ids=list(ids), header=header)
+
+    def rebase(self, ids):
+        '''the label file was just rewritten with the shapes ids.'''
+        self.append('rebase', file=self._stat(), ids=list(ids))
+
+    def append(self, op, **kwargs):
+        kwargs['op'] = op
+        self._f.write(json_codec.dumps(kwargs) + '\n')
+        self._f.flush()
+        self.count += 1
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def discard(self):
+        self.close()
+        if osp.exists(self.path):
+            os.remove(self.path)
+
+    def records(self):
+        records = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    records.append(json_codec.loads(line))
+                except ValueError:
+                    # a record cut short by the crash, nothing follows it
+                    break
+        return records
+
+    def replay(self, labelFile=None):
+        '''
+        apply the journal to labelFile (None when the label file was never
+        written) and return it, or return None if the journal does not
+        belong to the label file on disk any more.
+        '''
+        records = self.records()
+        if not records or records[0]['op'] != 'base':
+            return None
+        current = self._stat()
+        start = None
+        for i, r in enumerate(records):
+            if r['op'] in ('base', 'rebase') and r['file'] == current:
+                start = i
+        if start is None:
+            logger.warn('Discarding stale journal {}'.format(self.path))
+            return None
+
+        if labelFile is None:
+            header = records[0]['header']
+            labelFile = LabelFile()
+            labelFile.filename = self.labelPath
+            labelFile.imagePath = header['imagePath']
+            labelFile.imageHeight = header['imageHeight']
+            labelFile.imageWidth = header['imageWidth']
+            labelFile.lineColor = header['lineColor']
+            labelFile.fillColor = header['fillColor']
+            labelFile.otherData = header['otherData']
+            labelFile.flags = header['flags']
+            labelFile.shapes = []
+
+        order = list(records[start]['ids'])
+        if len(order) != len(labelFile.shapes):
+            logger.warn('Discarding journal {}, it does not match the label '
+                        'file'.format(self.path))
+            return None
+        shapes = dict(zip(order, labelFile.shapes))
+        for r in records[start + 1:]:
+            op = r['op']
+            if op == 'put':
+                s = r['shape']
+                if r['id'] not in shapes:
+                    order.append(r['id'])
+                shapes[r['id']] = LabelFile.shapeTuple(s)
+            elif op == 'del':
+                if shapes.pop(r['id'], None) is not None:
+                    order.remove(r['id'])
+            elif op == 'order':
+                order = [i for i in r['ids'] if i in shapes]
+            elif op == 'meta':
+                labelFile.flags = r['flags']
+                labelFile.lineColor = r['lineColor']
+                labelFile.fillColor = r['fillColor']
+        labelFile.shapes = [shapes[i] for i in order]
+        return labelFile
@@ -0,0 +1,385 @@
+import bisect
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import Qt
+
+
+class _Group(object):
+    '''the shapes of one label, a top level row when grouped.'''
+
+    def __init__(self, label):
+        self.label = label
+        self.shapes = []
+        self.hidden = 0
+        # id(shape) -> row in shapes, rebuilt after a removal
+        self._rowOfId = {}
+        self._rowsDirty = False
+
+    def append(self, shape):
+        if not self._rowsDirty:
+            self._rowOfId[id(shape)] = len(self.shapes)
+        self.shapes.append(shape)
+
+    def remove(self, shape):
+        del self.shapes[self.rowOf(shape)]
+        self._rowsDirty = True
+
+    def rowOf(self, shape):
+        if self._rowsDirty:
+            self._rowOfId = {id(s): row for row, s in enumerate(self.shapes)}
+            self._rowsDirty = False
+        return self._rowOfId[id(shape)]
+
+
+class LabelListModel(QtCore.QAbstractItemModel):
+    '''
+    the shapes of the current image for the shape dock, in drawing order,
+    or grouped by label ("label (count)" rows with the shapes below them)
+    when setGrouped(True).
+
+    the model only holds the shape objects: rows are rendered when the view
+    asks for them, whatever the number of shapes. a shape row is checked
+    when the shape is visible; the check box of a label row shows and sets
+    the visibility of all its shapes at once. visibility changes are
+    reported as one visibilityChanged(shapes, visible) per user action.
+    '''
+
+    visibilityChanged = QtCore.pyqtSignal(list, bool)
+
+    def __init__(self, parent=None):
+        super(LabelListModel, self).__init__(parent)
+        self.grouped = False
+        self._reset()
+
+    def _reset(self):
+        self._shapes = []
+        # id(shape) -> row in _shapes, rebuilt after a removal
+        self._rowOfId = {}
+        self._rowsDirty = False
+        # labels in sorted order and their groups
+        self._labels = []
+        self._groups = {}
+        # id(shape) -> the group it is in (the label it was added with)
+        self._groupOfId = {}
+        self._hidden = set()
+
+    # QAbstractItemModel
+    def index(self, row, column=0, parent=QtCore.QModelIndex()):
+        if column != 0 or row < 0:
+            return QtCore.QModelIndex()
+        if not self.grouped:
+            if parent.isValid() or row >= len(self._shapes):
+                return QtCore.QModelIndex()
+            return self.createIndex(row, 0)
+        if not parent.isValid():
+            if row >= len(self._labels):
+                return QtCore.QModelIndex()
+            return self.createIndex(row, 0)
+        if parent.internalPointer() is not None:
+            return QtCore.QModelIndex()
+        group = self._groups[self._labels[parent.row()]]
+        if row >= len(group.shapes):
+            return QtCore.QModelIndex()
+        # the group object is kept alive by _groups while the row exists
+        return self.createIndex(row, 0, group)
+
+    def parent(self, index):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        group = index.internalPointer()
+        if group is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._groupRow(group.label), 0)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if not parent.isValid():
+            return len(self._labels) if self.grouped else len(self._shapes)
+        if not self.grouped or parent.internalPointer() is not None:
+            return 0
+        return len(self._groups[self._labels[parent.row()]].shapes)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        group = self._groupOf(index)
+        if group is not None:
+            if role == Qt.DisplayRole:
+                return '{} ({})'.format(group.label, len(group.shapes))
+            if role == Qt.CheckStateRole:
+                if not group.hidden:
+                    return Qt.Checked
+                if group.hidden == len(group.shapes):
+                    return Qt.Unchecked
+                return Qt.PartiallyChecked
+            return None
+        shape = self.shapeOf(index)
+        if shape is None:
+            return None
+        if role == Qt.DisplayRole:
+            return shape.getLabel()
+        if role == Qt.CheckStateRole:
+            return Qt.Unchecked if id(shape) in self._hidden else Qt.Checked
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        visible = value != Qt.Unchecked
+        group = self._groupOf(index)
+        if group is not None:
+            self.setVisible(group.shapes, visible)
+        else:
+            self.setVisible([self.shapeOf(index)], visible)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
+        if self._groupOf(index) is None:
+            flags |= Qt.ItemIsSelectable
+        return flags
+
+    # rows
+    def _groupOf(self, index):
+        '''the group of a label row, None for a shape row.'''
+        if not self.grouped or index.internalPointer() is not None:
+            return None
+        return self._groups[self._labels[index.row()]]
+
+    def _groupRow(self, label):
+        return bisect.bisect_left(self._labels, label)
+
+    def _updateRowIndex(self):
+        self._rowOfId = {id(shape): row
+                         for row, shape in enumerate(self._shapes)}
+        self._rowsDirty = False
+
+    def shapeOf(self, index):
+        '''the shape of a row, None for a label row.'''
+        if not index.isValid():
+            return None
+        group = index.internalPointer()
+        if group is not None:
+            return group.shapes[index.row()]
+        if self.grouped:
+            return None
+        return self._shapes[index.row()]
+
+    def indexOf(self, shape):
+        '''the row of shape, an invalid index if it is not in the list.'''
+        group = self._groupOfId.get(id(shape))
+        if group is None:
+            return QtCore.QModelIndex()
+        if self.grouped:
+            return self.createIndex(group.rowOf(shape), 0, group)
+        if self._rowsDirty:
+            self._updateRowIndex()
+        return self.createIndex(self._rowOfId[id(shape)], 0)
+
+    def groupIndex(self, label):
+        if not self.grouped or label not in self._groups:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._groupRow(label), 0)
+
+    @property
+    def shapes(self):
+        '''the shapes in drawing order.'''
+        return list(self._shapes)
+
+    def count(self):
+        return len(self._shapes)
+
+    def contains(self, shape):
+        return id(shape) in self._groupOfId
+
+    def clear(self):
+        self.beginResetModel()
+        self._reset()
+        self.endResetModel()
+
+    def setGrouped(self, value):
+        if self.grouped == bool(value):
+            return
+        self.beginResetModel()
+        self.grouped = bool(value)
+        self.endResetModel()
+
+    def _join(self, shape, hidden=False):
+        '''put shape into the group of its label.'''
+        label = shape.getLabel()
+        group = self._groups.get(label)
+        if group is None:
+            group = self._groups[label] = _Group(label)
+            bisect.insort(self._labels, label)
+        group.append(shape)
+        self._groupOfId[id(shape)] = group
+        if hidden:
+            self._hidden.add(id(shape))
+            group.hidden += 1
+        return group
+
+    def _leave(self, shape):
+        '''take shape out of its group; return whether it was hidden.'''
+        group = self._groupOfId.pop(id(shape))
+        hidden = id(shape) in self._hidden
+        if hidden:
+            self._hidden.discard(id(shape))
+            group.hidden -= 1
+        group.remove(shape)
+        if not group.shapes:
+            del self._groups[group.label]
+            self._labels.remove(group.label)
+        return hidden
+
+    def _append(self, shape):
+        self._rowOfId[id(shape)] = len(self._shapes)
+        self._shapes.append(shape)
+        self._join(shape)
+
+    def _beginInsert(self, shape):
+        '''beginInsertRows for the row shape gets in the group of its label.'''
+        root = QtCore.QModelIndex()
+        label = shape.getLabel()
+        group = self._groups.get(label)
+        if group is None:
+            row = bisect.bisect_left(self._labels, label)
+            self.beginInsertRows(root, row, row)
+        else:
+            self.beginInsertRows(self.groupIndex(label),
+                                 len(group.shapes), len(group.shapes))
+        return group
+
+    def _beginRemove(self, shape):
+        '''beginRemoveRows for the row of shape (and its label row if empty).'''
+        group = self._groupOfId[id(shape)]
+        if self.grouped and len(group.shapes) == 1:
+            row = self._groupRow(group.label)
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            return None
+        index = self.indexOf(shape)
+        self.beginRemoveRows(index.parent(), index.row(), index.row())
+        return group
+
+    def addShapes(self, shapes):
+        '''append the shapes of a label file, in one go.'''
+        if not shapes:
+            return
+        self.beginResetModel()
+        if self._rowsDirty:
+            self._updateRowIndex()
+        for shape in shapes:
+            self._append(shape)
+        self.endResetModel()
+
+    def addShape(self, shape):
+        if self._rowsDirty:
+            self._updateRowIndex()
+        if not self.grouped:
+            row = len(self._shapes)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self._append(shape)
+            self.endInsertRows()
+            return
+        group = self._beginInsert(shape)
+        self._append(shape)
+        self.endInsertRows()
+        if group is not None:
+            self._groupChanged(group)
+
+    def removeShape(self, shape):
+        if id(shape) not in self._groupOfId:
+            return
+        if self._rowsDirty:
+            self._updateRowIndex()
+        group = self._beginRemove(shape)
+        self._leave(shape)
+        del self._shapes[self._rowOfId.pop(id(shape))]
+        self._rowsDirty = True
+        self.endRemoveRows()
+        if self.grouped and group is not None:
+            self._groupChanged(group)
+
+    def relabel(self, shape):
+        '''move shape to the group of its new label, see editLabel.'''
+        group = self._groupOfId.get(id(shape))
+        if group is None:
+            return
+        if group.label == shape.getLabel() or not self.grouped:
+            # the row stays where it is
+            if group.label != shape.getLabel():
+                self._join(shape, self._leave(shape))
+            index = self.indexOf(shape)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+            return
+        # the row moves to another label row, the drawing order is kept
+        old = self._beginRemove(shape)
+        hidden = self._leave(shape)
+        self.endRemoveRows()
+        if old is not None:
+            self._groupChanged(old)
+        new = self._beginInsert(shape)
+        self._join(shape, hidden)
+        self.endInsertRows()
+        if new is not None:
+            self._groupChanged(new)
+
+    def _groupChanged(self, group):
+        '''the count and check state of a label row.'''
+        index = self.groupIndex(group.label)
+        if index.isValid():
+            self.dataChanged.emit(index, index,
+                                  [Qt.DisplayRole, Qt.CheckStateRole])
+
+    # visibility
+    def isVisible(self, shape):
+        return id(shape) not in self._hidden
+
+    def setVisible(self, shapes, visible):
+        '''show or hide shapes, one visibilityChanged for all of them.'''
+        changed = [shape for shape in shapes
+                   if (id(shape) in self._hidden) == visible and
+                   id(shape) in self._groupOfId]
+        if not changed:
+            return
+        groups = {}
+        for shape in changed:
+            group = self._groupOfId[id(shape)]
+            groups[id(group)] = group
+            if visible:
+                self._hidden.discard(id(shape))
+                group.hidden -= 1
+            else:
+                self._hidden.add(id(shape))
+                group.hidden += 1
+        roles = [Qt.CheckStateRole]
+        if self.grouped:
+            for group in groups.values():
+                parent = self.groupIndex(group.label)
+                self.dataChanged.emit(parent, parent, roles)
+                self.dataChanged.emit(
+                    self.index(0, 0, parent),
+                    self.index(len(group.shapes) - 1, 0, parent), roles)
+        elif len(changed) == 1:
+            index = self.indexOf(changed[0])
+            self.dataChanged.emit(index, index, roles)
+        else:
+            self.dataChanged.emit(self.index(0),
+                                  self.index(len(self._shapes) - 1), roles)
+        self.visibilityChanged.emit(changed, visible)
+
+    def setAllVisible(self, visible):
+        self.setVisible(self._shapes, visible)
+
+    def setLabelVisible(self, label, visible):
+        group = self._groups.get(label)
+        if group is not None:
+            self.setVisible(group.shapes, visible)
+
+    def labelCounts(self):
+        '''[(label, number of shapes)] in label order.'''
+        return [(label, len(self._groups[label].shapes))
+                for label in self._labels]
@@ -0,0 +1,360 @@
+import glob
+import os
+import os.path as osp
+import sqlite3
+import threading
+
+from . import json_codec
+from . import logger
+from .label_file import LabelFile
+from .label_file import LabelFileError
+from .label_file import shapeKeys
+from .label_index import LabelIndex
+
+
+class JsonLabelStore(object):
+    '''
+    the default backend: one labelme json file next to every image,
+    read and written through LabelFile.
+    '''
+
+    name = 'json'
+
+    def __init__(self, root=None):
+        self.root = root
+        self.index = LabelIndex(root) if root else None
+
+    def close(self):
+        if self.index is not None:
+            self.index.save()
+
+    def refresh(self):
+        if self.index is not None:
+            self.index.update()
+
+    def exists(self, labelPath):
+        return osp.exists(labelPath) and LabelFile.isLabelFile(labelPath)
+
+    def load(self, labelPath):
+        return LabelFile(labelPath, loadImageData=False)
+
+    def save(self, filename, **kwargs):
+        lf = LabelFile()
+        lf.save(filename=filename, **kwargs)
+        if self.index is not None:
+            self.index.put(
+                filename,
+                ((s['label'], s['points']) for s in kwargs['shapes']),
+                (kwargs.get('otherData') or {}).get('geoTrans'),
+                kwargs.get('imagePath'),
+            )
+        return lf
+
+    def labelFiles(self):
+        '''label files below the root, as of the last refresh().'''
+        if self.index is None:
+            return []
+        return self.index.labelFiles()
+
+    def labels(self):
+        if self.index is None:
+            return set()
+        return self.index.labels()
+
+    def importJson(self):
+        return 0
+
+    def exportJson(self):
+        return 0
+
+
+class SqliteLabelStore(object):
+    '''
+    all annotations of a dataset in one sqlite database kept in the dataset
+    root. rows are keyed by the path the json label file would have, so the
+    store can be imported from and exported to the per-image json layout;
+    `exported` marks the rows whose json file is up to date.
+    the connection is shared with the save thread and used under `lock`.
+    '''
+
+    name = 'sqlite'
+    dbName = '.rslabel.sqlite'
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY,
+            label_path TEXT NOT NULL UNIQUE,
+            image_path TEXT,
+            image_height INTEGER,
+            image_width INTEGER,
+            line_color TEXT,
+            fill_color TEXT,
+            flags TEXT,
+            other_data TEXT,
+            exported INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS shapes (
+            id INTEGER PRIMARY KEY,
+            image_id INTEGER NOT NULL
+                REFERENCES images(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            label TEXT,
+            shape_type TEXT,
+            line_color TEXT,
+            fill_color TEXT,
+            probability REAL,
+            other_data TEXT
+        );
+        CREATE TABLE IF NOT EXISTS points (
+            shape_id INTEGER NOT NULL
+                REFERENCES shapes(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            x REAL,
+            y REAL
+        );
+        CREATE INDEX IF NOT EXISTS shapes_label ON shapes(label);
+        CREATE INDEX IF NOT EXISTS shapes_image ON shapes(image_id, idx);
+        CREATE INDEX IF NOT EXISTS points_shape ON points(shape_id, idx);
+    '''
+
+    def __init__(self, root, dbPath=None):
+        self.root = root
+        if dbPath is None:
+            dbPath = osp.join(root, self.dbName)
+        self.dbPath = dbPath
+        self.isNew = not osp.exists(dbPath)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(dbPath, check_same_thread=False)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript(self.schema)
+        columns = [row[1] for row in
+                   self.conn.execute('PRAGMA table_info(images)')]
+        if 'exported' not in columns:
+            # a store from before exports were incremental
+            self.conn.execute(
+                'ALTER TABLE images ADD COLUMN exported INTEGER DEFAULT 0')
+            self.conn.commit()
+        columns = [row[1] for row in
+                   self.conn.execute('PRAGMA table_info(shapes)')]
+        if 'other_data' not in columns:
+            # a store from before the other keys of shapes were kept
+            self.conn.execute('ALTER TABLE shapes ADD COLUMN other_data TEXT')
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def refresh(self):
+        pass
+
+    def _key(self, labelPath):
+        return osp.relpath(labelPath, self.root).replace('\\', '/')
+
+    def _path(self, key):
+        return osp.join(self.root, key).replace('\\', '/')
+
+    def exists(self, labelPath):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT 1 FROM images WHERE label_path = ?',
+                (self._key(labelPath),)).fetchone()
+        return row is not None
+
+    def load(self, labelPath):
+        with self.lock:
+            return self._load(labelPath)
+
+    def _load(self, labelPath):
+        row = self.conn.execute(
+            'SELECT id, image_path, image_height, image_width, line_color, '
+            'fill_color, flags, other_data FROM images WHERE label_path = ?',
+            (self._key(labelPath),)).fetchone()
+        if row is None:
+            raise LabelFileError('no annotation for {}'.format(labelPath))
+        imageId = row[0]
+        points = {}
+        for shapeId, x, y in self.conn.execute(
+                'SELECT p.shape_id, p.x, p.y FROM points p '
+                'JOIN shapes s ON p.shape_id = s.id '
+                'WHERE s.image_id = ? ORDER BY p.shape_id, p.idx',
+                (imageId,)):
+            points.setdefault(shapeId, []).append([x, y])
+        shapes = [
+            LabelFile.shapeTuple(dict(
+                label=label,
+                points=points.get(shapeId, []),
+                line_color=_loads(line_color),
+                fill_color=_loads(fill_color),
+                shape_type=shape_type or 'polygon',
+                probability=probability,
+            ), _loads(other_data))
+            for shapeId, label, shape_type, line_color, fill_color,
+            probability, other_data in self.conn.execute(
+                'SELECT id, label, shape_type, line_color, fill_color, '
+                'probability, other_data FROM shapes '
+                'WHERE image_id = ? ORDER BY idx', (imageId,))
+        ]
+        lf = LabelFile()
+        lf.filename = labelPath
+        lf.imagePath = row[1]
+        lf.imageHeight = row[2]
+        lf.imageWidth = row[3]
+        lf.lineColor = _loads(row[4])
+        lf.fillColor = _loads(row[5])
+        lf.flags = _loads(row[6])
+        lf.otherData = _loads(row[7]) or {}
+        lf.shapes = shapes
+        return lf
+
+    def save(
+        self,
+        filename,
+        shapes,
+        imagePath,
+        imageHeight,
+        imageWidth,
+        imageData=None,
+        lineColor=None,
+        fillColor=None,
+        otherData=None,
+        flags=None,
+        binaryPoints=False,
+    ):
+        '''
+        same arguments as LabelFile.save, written in one transaction
+        (binaryPoints does not apply, points are rows of their own).
+        '''
+        try:
+            with self.lock, self.conn:
+                self._save(self._key(filename), shapes, imagePath,
+                           imageHeight, imageWidth, lineColor, fillColor,
+                           otherData, flags)
+        except sqlite3.Error as e:
+            raise LabelFileError(e)
+        lf = LabelFile()
+        lf.filename = filename
+        return lf
+
+    def _save(self, key, shapes, imagePath, imageHeight, imageWidth,
+              lineColor, fillColor, otherData, flags, exported=False):
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM images WHERE label_path = ?', (key,))
+        cur.execute(
+            'INSERT INTO images (label_path, image_path, image_height, '
+            'image_width, line_color, fill_color, flags, other_data, '
+            'exported) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, imagePath, imageHeight, imageWidth, _dumps(lineColor),
+             _dumps(fillColor), _dumps(flags or {}),
+             _dumps(otherData or {}), int(exported)))
+        imageId = cur.lastrowid
+        for idx, s in enumerate(shapes):
+            other = dict((key, value) for key, value in s.items()
+                         if key not in shapeKeys)
+            cur.execute(
+                'INSERT INTO shapes (image_id, idx, label, shape_type, '
+                'line_color, fill_color, probability, other_data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (imageId, idx, s['label'], s.get('shape_type', 'polygon'),
+                 _dumps(s.get('line_color')), _dumps(s.get('fill_color')),
+                 s.get('probability'), _dumps(other or None)))
+            shapeId = cur.lastrowid
+            cur.executemany(
+                'INSERT INTO points (shape_id, idx, x, y) VALUES (?, ?, ?, ?)',
+                [(shapeId, i, float(p[0]), float(p[1]))
+                 for i, p in enumerate(s['points'])])
+
+    def remove(self, labelPath):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM images WHERE label_path = ?',
+                              (self._key(labelPath),))
+
+    def labelFiles(self):
+        with self.lock:
+            return [self._path(key) for key, in self.conn.execute(
+                'SELECT label_path FROM images ORDER BY label_path')]
+
+    def labels(self):
+        with self.lock:
+            return set(label for label, in self.conn.execute(
+                'SELECT DISTINCT label FROM shapes'))
+
+    def importJson(self):
+        '''
+        import every labelme json file below the root, replacing what the
+        store holds for them. return the number of imported files.
+        '''
+        count = 0
+        jsons = glob.glob(self.root + '/**/*.json', recursive=True)
+        with self.lock, self.conn:
+            for labelPath in jsons:
+                try:
+                    lf = LabelFile(labelPath, loadImageData=False)
+                except LabelFileError as e:
+                    logger.warn('Skipping {}: {}'.format(labelPath, e))
+                    continue
+                shapes = [LabelFile.shapeDictOf(s) for s in lf.shapes]
+                self._save(self._key(labelPath), shapes, lf.imagePath,
+                           lf.imageHeight, lf.imageWidth, lf.lineColor,
+                           lf.fillColor, lf.otherData, lf.flags,
+                           exported=True)
+                count += 1
+        return count
+
+    def exportJson(self):
+        '''
+        write the store back to the per-image json layout, so the json
+        based exporters and other labelme tools see the current annotations.
+        only the rows saved since the last export are written. return the
+        number of written files.
+        '''
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT id, label_path FROM images WHERE NOT exported '
+                'ORDER BY label_path').fetchall()
+        for imageId, key in rows:
+            labelPath = self._path(key)
+            lf = self.load(labelPath)
+            if osp.dirname(labelPath) and not osp.exists(osp.dirname(labelPath)):
+                os.makedirs(osp.dirname(labelPath))
+            lf.save(
+                filename=labelPath,
+                shapes=[LabelFile.shapeDictOf(s) for s in lf.shapes],
+                imagePath=lf.imagePath,
+                imageHeight=lf.imageHeight,
+                imageWidth=lf.imageWidth,
+                lineColor=lf.lineColor,
+                fillColor=lf.fillColor,
+                otherData=lf.otherData,
+                flags=lf.flags,
+            )
+            # a row saved meanwhile was inserted again, with another id
+            with self.lock, self.conn:
+                self.conn.execute(
+                    'UPDATE images SET exported = 1 WHERE id = ?', (imageId,))
+        return len(rows)
+
+
+def openLabelStore(backend, root=None):
+    '''create the label store selected by the `label_backend` config key.'''
+    if backend == 'sqlite' and root:
+        store = SqliteLabelStore(root)
+        if store.isNew:
+            store.importJson()
+        return store
+    return JsonLabelStore(root)
+
+
+def _dumps(value):
+    if value is None:
+        return None
+    return json_codec.dumps(value)
+
+
+def _loads(value):
+    if value is None:
+        return None
+    return json_codec.loads(value)
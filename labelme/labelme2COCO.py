@@ -2,11 +2,13 @@
 # !/usr/bin/env python
 
 import argparse
-import json
 import numpy as np
 import glob
 import functools
 
+from . import json_codec
+from .label_file import LabelFile
+
 
 def map2img(geoTrans, x, y):
     u = (x - geoTrans[0]) / geoTrans[1]
@@ -64,49 +66,35 @@ class labelme2coco(object):
 
     def data_transfer(self):
         for num, json_file in enumerate(self.labelme_json):
-            with open(json_file, 'r') as fp:
-                data = json.load(fp)  #
-                self.images.append(self.image(data, num))
-                otherData = {}
-                keys = [
-                    'imageData',
-                    'imagePath',
-                    'lineColor',
-                    'fillColor',
-                    'shapes',  # polygonal annotations
-                    'flags',   # image level flags
-                    'imageHeight',
-                    'imageWidth', ]
-                for key, value in data.items():
-                    if key not in keys:
-                        otherData[key] = value
-                geoTrans = otherData['geoTrans']
-                mapfunc = functools.partial(map2img_p, geoTrans)
-                for shape in data['shapes']:
-                    label = shape['label'].split('_')
-                    if(len(label) == 2):  # *
-                        if label[1] not in self.labels:
-                            self.categories.append(self.categorie(label))
-                            self.labels.append(label[1])
-                    else:
-                        if label[0] not in self.labels:
-                            self.categories.append(self.categorie(label))
-                            self.labels.append(label[0])
-                    points = shape['points']
-                    prob = shape['probability']
-                    # convert to image coord
-                    points = list(map(mapfunc, points))
-                    self.annotations.append(
-                        self.annotation(points, label, prob, num))
-                    self.annID += 1
-
-    def image(self, data, num):
+            lf = LabelFile(json_file, loadImageData=False)
+            self.images.append(self.image(lf, num))
+            geoTrans = lf.otherData['geoTrans']
+            mapfunc = functools.partial(map2img_p, geoTrans)
+            for shape in lf.shapes:
+                label = shape[0].split('_')
+                if(len(label) == 2):  # *
+                    if label[1] not in self.labels:
+                        self.categories.append(self.categorie(label))
+                        self.labels.append(label[1])
+                else:
+                    if label[0] not in self.labels:
+                        self.categories.append(self.categorie(label))
+                        self.labels.append(label[0])
+                points = shape[1]
+                prob = shape[5]
+                # convert to image coord
+                points = list(map(mapfunc, points))
+                self.annotations.append(
+                    self.annotation(points, label, prob, num))
+                self.annID += 1
+
+    def image(self, labelFile, num):
         image = {}
-        height, width = data['imageHeight'], data['imageWidth']
+        height, width = labelFile.imageHeight, labelFile.imageWidth
         image['height'] = height
         image['width'] = width
         image['id'] = num+1
-        image['file_name'] = data['imagePath'].split('/')[-1]
+        image['file_name'] = labelFile.imagePath.split('/')[-1]
         self.height = height
         self.width = width
         return image
@@ -172,5 +160,5 @@ class labelme2coco(object):
     def save_json(self):
         self.data_transfer()
         self.data_coco = self.data2coco()
-        json.dump(self.data_coco, open(self.save_json_path, 'w'),
-                  indent=4)
+        with open(self.save_json_path, 'w') as f:
+            json_codec.dump(self.data_coco, f, indent=4)
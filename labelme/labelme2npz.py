@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import glob
+import os
+import os.path as osp
+
+from labelme import json_codec
+from labelme.label_file import LabelFile
+from labelme.label_file import loadPoints
+from labelme.label_file import pointsFileName
+from labelme.label_file import savePoints
+from labelme.label_file import writeAtomic
+
+
+def toBinary(label_file):
+    with open(label_file) as f:
+        data = json_codec.load(f)
+    if data.get('pointsFile'):
+        return False
+    points_file = pointsFileName(label_file)
+    savePoints(points_file, [s['points'] for s in data['shapes']])
+    for s in data['shapes']:
+        s['points'] = None
+    data['pointsFile'] = osp.basename(points_file)
+    writeAtomic(label_file, lambda f: json_codec.dump(
+        data, f, indent=2))
+    return True
+
+
+def toJson(label_file):
+    with open(label_file) as f:
+        data = json_codec.load(f)
+    if not data.get('pointsFile'):
+        return False
+    points_file = osp.join(osp.dirname(label_file), data.pop('pointsFile'))
+    for s, points in zip(data['shapes'], loadPoints(points_file)):
+        s['points'] = points
+    writeAtomic(label_file, lambda f: json_codec.dump(
+        data, f, indent=2))
+    os.remove(points_file)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='move the points of labelme json files to binary '
+                    '.points.npz sidecars, or back with --reverse',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('in_dir', help='input dir with annotated files')
+    parser.add_argument('--reverse', action='store_true',
+                        help='put the points back into the json files')
+    args = parser.parse_args()
+
+    convert = toJson if args.reverse else toBinary
+    converted = 0
+    for label_file in glob.glob(osp.join(args.in_dir, '**', '*.json'),
+                                recursive=True):
+        if not LabelFile.isLabelFile(label_file):
+            continue
+        try:
+            if convert(label_file):
+                converted += 1
+                print('Converted:', label_file)
+        except Exception as e:
+            print('Skipping {}: {}'.format(label_file, e))
+    print('{} label files converted'.format(converted))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,6 @@ from __future__ import print_function
 
 import argparse
 import glob
-import json
 import os
 import os.path as osp
 
@@ -14,6 +13,7 @@ import numpy as np
 import PIL.Image
 
 import labelme
+from labelme.label_file import LabelFile
 
 
 def main():
@@ -54,8 +54,8 @@ def main():
 
     for label_file in glob.glob(osp.join(args.in_dir, '*.json')):
         print('Generating dataset from:', label_file)
-        with open(label_file) as f:
-            data = json.load(f)
+        # points may be in a .points.npz sidecar, LabelFile reads them
+        lf = LabelFile(label_file, loadImageData=False)
         base = osp.splitext(osp.basename(label_file))[0]
         out_img_file = osp.join(
             args.out_dir, 'JPEGImages', base + '.jpg')
@@ -64,7 +64,7 @@ def main():
         out_viz_file = osp.join(
             args.out_dir, 'AnnotationsVisualization', base + '.jpg')
 
-        img_file = osp.join(osp.dirname(label_file), data['imagePath'])
+        img_file = osp.join(osp.dirname(label_file), lf.imagePath)
         img = np.asarray(PIL.Image.open(img_file))
         PIL.Image.fromarray(img).save(out_img_file)
 
@@ -85,23 +85,23 @@ def main():
 
         bboxes = []
         labels = []
-        for shape in data['shapes']:
-            if shape['shape_type'] != 'rectangle':
-                print('Skipping shape: label={label}, shape_type={shape_type}'
-                      .format(**shape))
+        for label, points, _, _, shape_type, _ in lf.shapes:
+            if shape_type != 'rectangle':
+                print('Skipping shape: label={}, shape_type={}'
+                      .format(label, shape_type))
                 continue
 
-            class_name = shape['label']
+            class_name = label
             class_id = class_names.index(class_name)
 
-            (xmin, ymin), (xmax, ymax) = shape['points']
+            (xmin, ymin), (xmax, ymax) = points
           
             bboxes.append([xmin, ymin, xmax, ymax])
             labels.append(class_id)
 
             xml.append(
                 maker.object(
-                    maker.name(shape['label']),
+                    maker.name(label),
                     maker.pose(),
                     maker.truncated(),
                     maker.difficult(),
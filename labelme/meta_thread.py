@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QMutex, QThread, QWaitCondition, pyqtSignal
+
+
+class MetaThread(QThread):
+    '''
+    reads the header metadata (raster_cache.rasterMeta) of the files
+    request()ed, in batches over a pool of threads, and reports every
+    batch through `ready` as [(path, meta)]; meta is None when the file
+    cannot be read. the file list requests the rows it shows; a path
+    requested again while it is queued is read once.
+    '''
+
+    ready = pyqtSignal(list)
+
+    def __init__(self, meta, workers=4, batchSize=64):
+        QThread.__init__(self)
+        self.meta = meta
+        self.workers = workers
+        self.batchSize = batchSize
+        self.mutex = QMutex()
+        self.wakeUp = QWaitCondition()
+        self.queue = []
+        self.requested = set()
+        self.stopMe = 0
+
+    def request(self, path):
+        self.mutex.lock()
+        if path not in self.requested:
+            self.requested.add(path)
+            self.queue.append(path)
+            self.wakeUp.wakeOne()
+        self.mutex.unlock()
+
+    def clear(self):
+        self.mutex.lock()
+        self.queue = []
+        self.requested = set()
+        self.mutex.unlock()
+
+    def _meta(self, path):
+        try:
+            return self.meta(path)
+        except Exception as e:
+            print('*metadata of {} failed: {}'.format(path, e))
+            return None
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                self.mutex.lock()
+                while not self.queue and not self.stopMe:
+                    self.wakeUp.wait(self.mutex)
+                if self.stopMe:
+                    self.mutex.unlock()
+                    return
+                # the rows requested last are the ones on screen now
+                batch = self.queue[-self.batchSize:]
+                del self.queue[-self.batchSize:]
+                self.mutex.unlock()
+
+                result = list(zip(batch, pool.map(self._meta, batch)))
+                self.mutex.lock()
+                # a file removed and added again (replaced) is read again
+                self.requested.difference_update(batch)
+                self.mutex.unlock()
+                self.ready.emit(result)
+
+    def stop(self):
+        self.mutex.lock()
+        self.stopMe = 1
+        self.queue = []
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+        QThread.wait(self)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import math
+import os
+import os.path as osp
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+import gdal
+
+from labelme import json_codec
+from labelme.dir_scanner import imageExtensions
+from labelme.dir_scanner import labelName
+from labelme.dir_scanner import scanImages
+from labelme.label_file import writeAtomic
+from labelme.prepare_dataset import overviewLevels
+from labelme.raster_cache import omdFileName
+
+
+tmpSuffix = '.cog.tmp.tif'
+
+
+def isOptimized(ds):
+    '''a tiled GeoTIFF with internal overviews (or too small for them).'''
+    if ds.GetDriver().ShortName != 'GTiff':
+        return False
+    if ds.GetMetadataItem('LAYOUT', 'IMAGE_STRUCTURE') == 'COG':
+        return True
+    band = ds.GetRasterBand(1)
+    blockX, blockY = band.GetBlockSize()
+    tiled = blockX == blockY and blockX < ds.RasterXSize
+    levels = overviewLevels(ds.RasterXSize, ds.RasterYSize)
+    return tiled and (band.GetOverviewCount() > 0 or not levels)
+
+
+def toCog(src, dst, compression, blockSize):
+    '''write src as a cloud optimized GeoTIFF dst.'''
+    options = [
+        'COMPRESS={}'.format(compression),
+        'BLOCKSIZE={}'.format(blockSize),
+        'BIGTIFF=IF_SAFER',
+        'NUM_THREADS=ALL_CPUS',
+    ]
+    if gdal.GetDriverByName('COG') is not None:
+        out = gdal.Translate(dst, src, format='COG',
+                             creationOptions=options + ['OVERVIEWS=AUTO'])
+        if out is None:
+            raise IOError('converting {} failed'.format(src))
+        del out
+        return
+    # gdal < 3.1: a tiled GeoTIFF, then its overviews inside it
+    out = gdal.Translate(dst, src, format='GTiff', creationOptions=[
+        'TILED=YES',
+        'BLOCKXSIZE={}'.format(blockSize),
+        'BLOCKYSIZE={}'.format(blockSize),
+        'COMPRESS={}'.format(compression),
+        'BIGTIFF=IF_SAFER',
+        'NUM_THREADS=ALL_CPUS',
+    ])
+    if out is None:
+        raise IOError('converting {} failed'.format(src))
+    levels = overviewLevels(out.RasterXSize, out.RasterYSize)
+    if levels:
+        gdal.SetConfigOption('COMPRESS_OVERVIEW', compression)
+        out.BuildOverviews('AVERAGE', levels)
+    del out
+
+
+def sidecarFiles(path):
+    '''the files gdal and the viewer keep next to the image path.'''
+    return [path + '.aux.xml', path + '.ovr',
+            osp.splitext(path)[0] + '.rrd', omdFileName(path)]
+
+
+def removeImage(path):
+    '''delete the image path and its sidecar files.'''
+    os.remove(path)
+    for sidecar in sidecarFiles(path):
+        if osp.exists(sidecar):
+            os.remove(sidecar)
+
+
+def stemGroups(paths):
+    '''
+    the images that share a stem with another one (a.tif and a.img), as
+    [[path, ...]]: they would be converted to the same a.tif and share the
+    label file a.json.
+    '''
+    groups = {}
+    for path in paths:
+        groups.setdefault(osp.normcase(osp.splitext(path)[0]), []).append(path)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def convertedEarlier(group):
+    '''whether group is an image and the .tif an earlier run made of it.'''
+    if len(group) != 2:
+        return False
+    tifs = [path for path in group if path.lower().endswith('.tif')]
+    if len(tifs) != 1:
+        return False
+    ds = gdal.Open(tifs[0], gdal.GA_ReadOnly)
+    return ds is not None and isOptimized(ds)
+
+
+def geoTransOf(ds):
+    '''the geoTrans the plugin keeps for ds, see imageInfo.'''
+    geoTrans = list(ds.GetGeoTransform())
+    if math.isclose(geoTrans[0], 0):
+        geoTrans = [0, 1, 0, ds.RasterYSize, 0, -1]
+    return geoTrans
+
+
+def updateLabelFile(label_file, imagePath, geoTrans):
+    '''point the label file at the converted image.'''
+    with open(label_file) as f:
+        data = json_codec.load(f)
+    if data.get('imagePath') == imagePath and \
+            data.get('geoTrans', geoTrans) == geoTrans:
+        return False
+    data['imagePath'] = imagePath
+    if 'geoTrans' in data:
+        data['geoTrans'] = geoTrans
+    writeAtomic(label_file, lambda f: json_codec.dump(data, f, indent=2))
+    return True
+
+
+def optimizeFile(path, compression, blockSize, removeSource):
+    '''runs in a worker process: convert path, update its label file.'''
+    start = time.time()
+    size = os.path.getsize(path)
+    result = dict(path=path, size=size, target=None, labels=False,
+                  error=None)
+    try:
+        ds = gdal.Open(path, gdal.GA_ReadOnly)
+        if ds is None:
+            raise IOError('gdal cannot open {}'.format(path))
+        stem, ext = osp.splitext(path)
+        if isOptimized(ds):
+            target = path
+        elif osp.normcase(stem + '.tif') != osp.normcase(path) and \
+                osp.exists(stem + '.tif'):
+            # main() skips images sharing a stem, never overwrite one
+            raise IOError('{} exists already'.format(stem + '.tif'))
+        else:
+            # labels are paired with images by their stem, so the converted
+            # image keeps it: a.img -> a.tif, a.tif is replaced
+            target = stem + '.tif'
+            tmp = stem + tmpSuffix
+            try:
+                toCog(ds, tmp, compression, blockSize)
+                del ds
+                os.replace(tmp, target)
+            finally:
+                if osp.exists(tmp):
+                    os.remove(tmp)
+            # external overviews of the old file are not needed any more
+            if target == path and osp.exists(path + '.ovr'):
+                os.remove(path + '.ovr')
+            if target != path and removeSource:
+                removeImage(path)
+            result['target'] = target
+        ds = gdal.Open(target, gdal.GA_ReadOnly)
+        label_file = osp.join(osp.dirname(path), labelName(osp.basename(path)))
+        if osp.exists(label_file):
+            result['labels'] = updateLabelFile(
+                label_file, osp.basename(target), geoTransOf(ds))
+        del ds
+    except Exception:
+        result['error'] = traceback.format_exc().strip().splitlines()[-1]
+    result['seconds'] = time.time() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='convert the images below a folder to tiled, cloud '
+                    'optimized GeoTIFFs with internal overviews and point '
+                    'their label files at them',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('in_dir', help='folder with the images')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes')
+    parser.add_argument('--compression', default='DEFLATE',
+                        choices=['NONE', 'DEFLATE', 'LZW', 'ZSTD', 'JPEG'])
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--remove-source', action='store_true',
+                        help='delete the images that were converted to a '
+                             'new .tif')
+    args = parser.parse_args()
+
+    todo = []
+    for _, entries in scanImages(args.in_dir, imageExtensions):
+        # (left over by an interrupted run)
+        todo.extend(path for path, _ in entries
+                    if not path.endswith(tmpSuffix))
+    skipped = set()
+    for group in stemGroups(todo):
+        skipped.update(group)
+        if convertedEarlier(group):
+            print('{} converted by an earlier run'.format(' / '.join(group)))
+        else:
+            print('skipped {}: same name, converting them would overwrite '
+                  'each other'.format(' / '.join(group)))
+    todo = [path for path in todo if path not in skipped]
+    print('{} images'.format(len(todo)))
+
+    start = time.time()
+    totalBytes = 0
+    converted = failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [
+            pool.submit(optimizeFile, path, args.compression,
+                        args.block_size, args.remove_source)
+            for path in todo
+        ]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            if result['error']:
+                failed += 1
+                print('[{}/{}] failed {}: {}'.format(
+                    i, len(todo), result['path'], result['error']))
+                continue
+            if result['target'] is None:
+                print('[{}/{}] {} is optimized already'.format(
+                    i, len(todo), result['path']))
+                continue
+            converted += 1
+            totalBytes += result['size']
+            print('[{}/{}] {} -> {}{} {:.1f} s'.format(
+                i, len(todo), result['path'], osp.basename(result['target']),
+                ' (label file updated)' if result['labels'] else '',
+                result['seconds']))
+
+    elapsed = time.time() - start
+    totalMb = totalBytes / 1024.0 / 1024.0
+    print('{} images converted, {:.1f} MB in {:.1f} s: {:.1f} MB/s, '
+          '{} failed'.format(converted, totalMb, elapsed,
+                             totalMb / elapsed if elapsed > 0 else 0.0,
+                             failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import collections
+
+from PyQt5.QtCore import QMutex, QThread, QWaitCondition
+
+
+class PrefetchThread(QThread):
+    '''
+    prepares the files around the current one before they are opened.
+
+    schedule() sets the files to prepare, nearest first, and the arguments
+    to prepare them with; the thread calls prefetch(filename, *args), which
+    returns (result, cost), for each of them and
+    keeps the results until take() hands one over. results are kept in
+    least recently used order within maxItems and a budget of the summed
+    cost (bytes); the oldest ones go first. discard() drops the result of
+    a file that changed, also when it is being prepared at that moment.
+    '''
+
+    def __init__(self, prefetch, maxItems=4, budget=256 * 1024 * 1024):
+        QThread.__init__(self)
+        self.prefetch = prefetch
+        self.maxItems = maxItems
+        self.budget = budget
+        self.mutex = QMutex()
+        self.wakeUp = QWaitCondition()
+        self.idle = QWaitCondition()
+        self.queue = []
+        self.args = ()
+        self.ready = collections.OrderedDict()
+        self.used = 0
+        self.current = None
+        self.dropped = False
+        self.stopMe = 0
+
+    def schedule(self, filenames, args=()):
+        '''prepare filenames, in this order, instead of what was queued.'''
+        self.mutex.lock()
+        self.args = args
+        self.queue = [f for f in filenames[:self.maxItems]
+                      if f not in self.ready and f != self.current]
+        # the nearest file is the most recently used
+        for f in reversed(filenames):
+            if f in self.ready:
+                self.ready.move_to_end(f)
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+
+    def take(self, filename):
+        '''
+        the result for filename, None if there is none (the caller reads
+        it then, so it is not prepared any more). waits if it is being
+        prepared right now.
+        '''
+        self.mutex.lock()
+        if filename in self.queue:
+            self.queue.remove(filename)
+        while self.current == filename:
+            self.idle.wait(self.mutex)
+        entry = self.ready.pop(filename, None)
+        if entry is not None:
+            self.used -= entry[1]
+        self.mutex.unlock()
+        return entry[0] if entry is not None else None
+
+    def discard(self, filename):
+        self.mutex.lock()
+        entry = self.ready.pop(filename, None)
+        if entry is not None:
+            self.used -= entry[1]
+        if filename in self.queue:
+            self.queue.remove(filename)
+        if self.current == filename:
+            self.dropped = True
+        self.mutex.unlock()
+
+    def clear(self):
+        self.mutex.lock()
+        self.queue = []
+        self.ready.clear()
+        self.used = 0
+        if self.current is not None:
+            self.dropped = True
+        self.mutex.unlock()
+
+    def _evict(self):
+        while self.ready and (len(self.ready) > self.maxItems or
+                              self.used > self.budget):
+            _, (_, cost) = self.ready.popitem(last=False)
+            self.used -= cost
+
+    def run(self):
+        while True:
+            self.mutex.lock()
+            while not self.queue and not self.stopMe:
+                self.wakeUp.wait(self.mutex)
+            if self.stopMe:
+                self.mutex.unlock()
+                return
+            filename = self.queue.pop(0)
+            args = self.args
+            self.current = filename
+            self.dropped = False
+            self.mutex.unlock()
+
+            try:
+                result, cost = self.prefetch(filename, *args)
+            except Exception as e:
+                print('*prefetch {} failed: {}'.format(filename, e))
+                result, cost = None, 0
+
+            self.mutex.lock()
+            self.current = None
+            if result is not None and not self.dropped and \
+                    cost <= self.budget:
+                self.ready[filename] = (result, cost)
+                self.used += cost
+                self._evict()
+            self.idle.wakeAll()
+            self.mutex.unlock()
+
+    def stop(self):
+        self.mutex.lock()
+        self.stopMe = 1
+        self.queue = []
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+        QThread.wait(self)
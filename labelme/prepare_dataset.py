@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import os
+import os.path as osp
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+
+import gdal
+
+from labelme import json_codec
+from labelme import raster_stats
+from labelme.dir_scanner import imageExtensions
+from labelme.dir_scanner import scanImages
+from labelme.raster_cache import rasterInfo
+
+
+resumeName = '.rslabel_prepare.jsonl'
+
+
+def overviewLevels(width, height, minSize=256):
+    '''2, 4, 8, ... until the smaller side of the overview is below minSize.'''
+    levels = []
+    level = 2
+    while min(width, height) // level >= minSize:
+        levels.append(level)
+        level *= 2
+    return levels
+
+
+def buildOverviews(path, resampling, compression):
+    '''build external (.ovr) overviews of path, False if it has them.'''
+    ds = gdal.Open(path, gdal.GA_ReadOnly)
+    if ds is None:
+        raise IOError('gdal cannot open {}'.format(path))
+    if ds.GetRasterBand(1).GetOverviewCount() > 0:
+        return False
+    levels = overviewLevels(ds.RasterXSize, ds.RasterYSize)
+    if not levels:
+        return False
+    gdal.SetConfigOption('COMPRESS_OVERVIEW', compression)
+    gdal.SetConfigOption('BIGTIFF_OVERVIEW', 'IF_SAFER')
+    if ds.BuildOverviews(resampling, levels) != 0:
+        raise IOError('building overviews of {} failed'.format(path))
+    del ds
+    return True
+
+
+def _init(statsMode, low, high):
+    raster_stats.setMode(statsMode, low, high)
+
+
+def prepareFile(path, minOverviewBytes, resampling, compression):
+    '''runs in a worker process: overviews (if big enough) and statistics.'''
+    start = time.time()
+    size = os.path.getsize(path)
+    result = dict(path=path, size=size, overviews=False, error=None)
+    try:
+        if size >= minOverviewBytes:
+            result['overviews'] = buildOverviews(path, resampling, compression)
+        # fills the raster cache and writes the .omd of the viewer; after
+        # the overviews, so approximate statistics can read them
+        if rasterInfo(path) is None:
+            raise IOError('gdal cannot open {}'.format(path))
+    except Exception:
+        result['error'] = traceback.format_exc().strip().splitlines()[-1]
+    result['seconds'] = time.time() - start
+    return result
+
+
+def resumePath(in_dir):
+    '''
+    the resume file of in_dir: in the folder, or below ~/.rslabel when the
+    folder (or the file in it) is read only.
+    '''
+    resumeFile = osp.join(in_dir, resumeName)
+    if osp.exists(resumeFile):
+        if os.access(resumeFile, os.W_OK):
+            return resumeFile
+    elif os.access(in_dir, os.W_OK):
+        return resumeFile
+    folder = osp.join(osp.expanduser('~'), '.rslabel', 'prepare')
+    if not osp.isdir(folder):
+        os.makedirs(folder)
+    key = osp.normcase(osp.abspath(in_dir)).encode('utf-8')
+    return osp.join(folder, '{}.jsonl'.format(hashlib.sha1(key).hexdigest()))
+
+
+def loadResume(resumeFile):
+    '''{path: (size, mtime)} of the files prepared by an earlier run.'''
+    done = {}
+    if not osp.exists(resumeFile):
+        return done
+    with open(resumeFile) as f:
+        for line in f:
+            try:
+                entry = json_codec.loads(line)
+            except Exception:
+                # the last line of an interrupted run
+                continue
+            done[entry['path']] = (entry['size'], entry['mtime'])
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='build the overviews and band statistics of the images '
+                    'below a folder, with a pool of worker processes',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('in_dir', help='folder with the images')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes')
+    parser.add_argument('--overview-min-mb', type=float, default=300,
+                        help='build overviews of images at least this big')
+    parser.add_argument('--resampling', default='AVERAGE',
+                        choices=['NEAREST', 'AVERAGE', 'BILINEAR', 'CUBIC',
+                                 'GAUSS', 'MODE'])
+    parser.add_argument('--compression', default='DEFLATE',
+                        choices=['NONE', 'DEFLATE', 'LZW', 'JPEG'])
+    parser.add_argument('--statistics', default='approximate',
+                        choices=raster_stats.modes)
+    parser.add_argument('--low-percent', type=float,
+                        default=raster_stats.lowPercent,
+                        help='percentile of the stretch minimum')
+    parser.add_argument('--high-percent', type=float,
+                        default=raster_stats.highPercent,
+                        help='percentile of the stretch maximum')
+    parser.add_argument('--restart', action='store_true',
+                        help='prepare every image again, not only the ones '
+                             'left by an interrupted run')
+    args = parser.parse_args()
+
+    resumeFile = resumePath(args.in_dir)
+    done = {} if args.restart else loadResume(resumeFile)
+    todo = []
+    skipped = 0
+    for _, entries in scanImages(args.in_dir, imageExtensions):
+        for path, _ in entries:
+            st = os.stat(path)
+            if done.get(path) == (st.st_size, st.st_mtime):
+                skipped += 1
+            else:
+                todo.append(path)
+    if skipped:
+        print('{} images prepared by an earlier run'.format(skipped))
+    print('{} images to prepare'.format(len(todo)))
+
+    start = time.time()
+    totalBytes = 0
+    failed = 0
+    with open(resumeFile, 'w' if args.restart else 'a') as resume, \
+            ProcessPoolExecutor(max_workers=max(1, args.jobs),
+                                initializer=_init,
+                                initargs=(args.statistics, args.low_percent,
+                                          args.high_percent)) as pool:
+        futures = [
+            pool.submit(prepareFile, path, args.overview_min_mb * 1024 * 1024,
+                        args.resampling, args.compression)
+            for path in todo
+        ]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            mb = result['size'] / 1024.0 / 1024.0
+            if result['error']:
+                failed += 1
+                print('[{}/{}] failed {}: {}'.format(
+                    i, len(todo), result['path'], result['error']))
+                continue
+            totalBytes += result['size']
+            print('[{}/{}] {} {:.1f} MB{} {:.1f} s'.format(
+                i, len(todo), result['path'], mb,
+                ' +overviews' if result['overviews'] else '',
+                result['seconds']))
+            # the mtime after the overviews were built (.ovr files do not
+            # touch the image)
+            st = os.stat(result['path'])
+            resume.write(json_codec.dumps(dict(
+                path=result['path'], size=st.st_size,
+                mtime=st.st_mtime)) + '\n')
+            resume.flush()
+
+    elapsed = time.time() - start
+    totalMb = totalBytes / 1024.0 / 1024.0
+    print('{} images, {:.1f} MB in {:.1f} s: {:.1f} MB/s, {} failed'.format(
+        len(todo) - failed, totalMb, elapsed,
+        totalMb / elapsed if elapsed > 0 else 0.0, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import os
+import os.path as osp
+import sqlite3
+import threading
+import time
+
+import gdal
+
+from . import json_codec
+from . import logger
+from . import raster_stats
+from .gdal_pool import openDataset
+
+
+class RasterCache(object):
+    '''
+    what is known about the images opened so far: raster size, band
+    count, datatype, geotransform, SRS, overview count and the band
+    statistics of raster_stats (min/max, stretch, histogram).
+
+    entries are keyed by the absolute path and only count while the size
+    and mtime of the image match, so an image that was replaced is read
+    again. the cache is one sqlite database for all images, kept below
+    maxBytes by dropping the least recently used entries. the prefetch
+    thread and the GUI both read it, so every access holds `lock`.
+
+    a hit does not write: the time it was used is kept in memory and
+    written with the next put, or once usedBatch hits are pending.
+    '''
+
+    usedBatch = 256
+
+    # bumped when the columns change, the cache is rebuilt then
+    version = 2
+    schema = '''
+        CREATE TABLE IF NOT EXISTS rasters (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            width INTEGER,
+            height INTEGER,
+            bands INTEGER,
+            datatype INTEGER,
+            geo_trans TEXT,
+            srs TEXT,
+            overviews INTEGER,
+            stats TEXT,
+            bytes INTEGER,
+            used REAL
+        );
+        CREATE INDEX IF NOT EXISTS rasters_used ON rasters(used);
+    '''
+
+    def __init__(self, dbPath, maxBytes=64 * 1024 * 1024):
+        self.dbPath = dbPath
+        self.maxBytes = maxBytes
+        self.lock = threading.RLock()
+        # key -> time of the hits not written yet
+        self._used = {}
+        # the worker processes of prepare_dataset share the database
+        self.conn = sqlite3.connect(dbPath, timeout=30,
+                                    check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != \
+                self.version:
+            self.conn.execute('DROP TABLE IF EXISTS rasters')
+            self.conn.execute('PRAGMA user_version = {}'.format(self.version))
+        self.conn.executescript(self.schema)
+
+    @staticmethod
+    def defaultPath():
+        return osp.join(osp.expanduser('~'), '.rslabel', 'raster_cache.sqlite')
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self._flushUsed()
+                self.conn.commit()
+                self.conn.close()
+                self.conn = None
+
+    @staticmethod
+    def _key(path):
+        return osp.normcase(osp.abspath(path))
+
+    def get(self, path):
+        '''the entry of the image path, None if unknown or outdated.'''
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = self._key(path)
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT size, mtime, width, height, bands, datatype, '
+                'geo_trans, srs, overviews, stats FROM rasters '
+                'WHERE path = ?',
+                (key,)).fetchone()
+            if row is None or row[0] != st.st_size or row[1] != st.st_mtime:
+                return None
+            self._used[key] = time.time()
+            if len(self._used) >= self.usedBatch:
+                self._flushUsed()
+                self.conn.commit()
+        return dict(
+            width=row[2],
+            height=row[3],
+            bands=row[4],
+            datatype=row[5],
+            geoTrans=json_codec.loads(row[6]),
+            srs=row[7],
+            overviews=row[8],
+            stats=json_codec.loads(row[9]) if row[9] else None,
+        )
+
+    def put(self, path, entry):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        geoTrans = json_codec.dumps(list(entry['geoTrans']))
+        stats = json_codec.dumps(entry['stats']) if entry['stats'] else None
+        size = 256 + len(geoTrans) + len(entry['srs']) + len(stats or '')
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO rasters VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self._key(path), st.st_size, st.st_mtime, entry['width'],
+                 entry['height'], entry['bands'], entry['datatype'],
+                 geoTrans, entry['srs'], entry['overviews'], stats, size,
+                 time.time()))
+            self._flushUsed()
+            self._evict()
+            self.conn.commit()
+
+    def _flushUsed(self):
+        if self._used:
+            self.conn.executemany(
+                'UPDATE rasters SET used = ? WHERE path = ?',
+                [(used, key) for key, used in self._used.items()])
+            self._used = {}
+
+    def _evict(self):
+        total = self.conn.execute(
+            'SELECT COALESCE(SUM(bytes), 0) FROM rasters').fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        # drop the least recently used down to 90% of the budget
+        drop = []
+        for key, size in self.conn.execute(
+                'SELECT path, bytes FROM rasters ORDER BY used'):
+            if total <= self.maxBytes * 0.9:
+                break
+            drop.append((key,))
+            total -= size
+        self.conn.executemany('DELETE FROM rasters WHERE path = ?', drop)
+
+
+_cache = None
+_maxBytes = 64 * 1024 * 1024
+
+
+def setMaxBytes(maxBytes):
+    global _maxBytes
+    _maxBytes = maxBytes
+    if _cache is not None:
+        _cache.maxBytes = maxBytes
+
+
+def rasterCache():
+    '''the shared RasterCache, None if it cannot be opened.'''
+    global _cache
+    if _cache is None:
+        path = RasterCache.defaultPath()
+        try:
+            if not osp.exists(osp.dirname(path)):
+                os.makedirs(osp.dirname(path))
+            _cache = RasterCache(path, _maxBytes)
+        except Exception as e:
+            logger.warn('Cannot open raster cache {}: {}'.format(path, e))
+            _cache = False
+    return _cache or None
+
+
+def omdFileName(filename):
+    '''the .omd file the viewer reads the display stretch of filename from.'''
+    return osp.splitext(filename)[0] + '.omd'
+
+
+def _statsCurrent(stats):
+    return stats is not None and \
+        stats['mode'] == raster_stats.mode and \
+        stats['lowPercent'] == raster_stats.lowPercent and \
+        stats['highPercent'] == raster_stats.highPercent
+
+
+def isGeoreferenced(entry):
+    return bool(entry['srs']) or \
+        list(entry['geoTrans']) != [0.0, 1.0, 0.0, 0.0, 0.0, 1.0]
+
+
+def rasterMeta(filename):
+    '''
+    width, height, bands, datatype, geoTrans, srs (wkt) and overviews
+    (count) of filename, from the cache or else from the image header; the
+    pixels are never read. None if gdal cannot open the image.
+    '''
+    cache = rasterCache()
+    entry = cache.get(filename) if cache is not None else None
+    if entry is not None:
+        return entry
+    img = openDataset(filename)
+    if img is None:
+        return None
+    band = img.GetRasterBand(1)
+    entry = dict(
+        width=img.RasterXSize,
+        height=img.RasterYSize,
+        bands=img.RasterCount,
+        datatype=band.DataType,
+        geoTrans=list(img.GetGeoTransform()),
+        srs=img.GetProjection() or '',
+        overviews=band.GetOverviewCount(),
+        stats=None,
+    )
+    del band, img
+    if cache is not None:
+        cache.put(filename, entry)
+    return entry
+
+
+def rasterInfo(filename):
+    '''
+    rasterMeta of filename and, for non Byte images, the band statistics
+    (stats), from the cache when it is up to date. the .omd of the viewer
+    is written from the statistics when it is missing or older than the
+    image, or when we wrote it and the statistics were just computed; an
+    .omd tuned by hand is left alone. None if gdal cannot open the image.
+    '''
+    entry = rasterMeta(filename)
+    if entry is None:
+        return None
+    # the mtime of the .omd we wrote last
+    omdMtime = (entry['stats'] or {}).get('omdMtime')
+    fresh = False
+    if entry['datatype'] != gdal.GDT_Byte and \
+            not _statsCurrent(entry['stats']):
+        entry['stats'] = raster_stats.computeStats(filename, entry['bands'])
+        entry['stats']['omdMtime'] = omdMtime
+        fresh = True
+    if entry['stats'] is not None:
+        omd = omdFileName(filename)
+        if _omdOutdated(filename, omd, fresh, omdMtime):
+            try:
+                raster_stats.writeOmd(omd, entry['stats'])
+                entry['stats']['omdMtime'] = os.stat(omd).st_mtime
+                fresh = True
+            except OSError as e:
+                # read only archive: the cache still has the statistics
+                logger.warn('Cannot write {}: {}'.format(omd, e))
+    if fresh:
+        cache = rasterCache()
+        if cache is not None:
+            cache.put(filename, entry)
+    return entry
+
+
+def _omdOutdated(filename, omd, fresh, omdMtime):
+    try:
+        mtime = os.stat(omd).st_mtime
+    except OSError:
+        return True
+    if mtime < os.stat(filename).st_mtime:
+        return True
+    # ours, not touched since
+    return fresh and mtime == omdMtime
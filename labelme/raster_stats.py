@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import gdal
+import numpy as np
+
+from .label_file import writeAtomic
+
+
+# approximate: a subsampled read of the band (its overview when there is
+# one), exact: every pixel
+modes = ('approximate', 'exact')
+mode = 'approximate'
+# the stretch of the viewer goes from the low to the high percentile
+lowPercent = 2.0
+highPercent = 98.0
+# pixels read per band at most in approximate mode
+samplePixels = 1024 * 1024
+buckets = 1024
+
+
+def setMode(value, low=None, high=None):
+    global mode, lowPercent, highPercent
+    if value not in modes:
+        raise ValueError('unknown statistics mode: {}'.format(value))
+    mode = value
+    if low is not None:
+        lowPercent = float(low)
+    if high is not None:
+        highPercent = float(high)
+
+
+def percentiles(histogram, lo, hi, low, high):
+    '''
+    the values at the low and high percent of a histogram of `buckets`
+    equal bins from lo to hi, interpolated within the bins.
+    '''
+    counts = np.asarray(histogram, dtype=np.float64)
+    total = counts.sum()
+    if total <= 0 or hi <= lo:
+        return lo, hi
+    cum = np.cumsum(counts)
+    width = (hi - lo) / len(counts)
+    values = []
+    for percent in (low, high):
+        target = total * percent / 100.0
+        i = int(np.searchsorted(cum, target))
+        # the first bin holding a pixel
+        while i < len(counts) - 1 and counts[i] == 0:
+            i += 1
+        i = min(i, len(counts) - 1)
+        before = cum[i - 1] if i > 0 else 0.0
+        frac = (target - before) / counts[i] if counts[i] > 0 else 0.0
+        values.append(float(lo + (i + min(max(frac, 0.0), 1.0)) * width))
+    return values[0], values[1]
+
+
+def _sampleBand(band):
+    '''a subsampled array of band, from the smallest big enough overview.'''
+    best = band
+    for i in range(band.GetOverviewCount()):
+        ov = band.GetOverview(i)
+        if ov is None:
+            continue
+        if ov.XSize * ov.YSize >= samplePixels and \
+                ov.XSize * ov.YSize < best.XSize * best.YSize:
+            best = ov
+    xsize, ysize = best.XSize, best.YSize
+    step = max(1.0, (float(xsize) * ysize / samplePixels) ** 0.5)
+    # a strided (nearest neighbour) read only touches the lines it needs
+    return best.ReadAsArray(
+        0, 0, xsize, ysize,
+        buf_xsize=max(1, int(xsize / step)),
+        buf_ysize=max(1, int(ysize / step)))
+
+
+def _bandStats(filename, bandIdx, statsMode, low, high):
+    # every worker thread reads through a dataset of its own; the workers
+    # only live for one computeStats, so it is not pooled
+    ds = gdal.Open(filename, gdal.GA_ReadOnly)
+    band = ds.GetRasterBand(bandIdx)
+    nodata = band.GetNoDataValue()
+    if statsMode == 'exact':
+        lo, hi = band.ComputeRasterMinMax(False)
+        histogram = band.GetHistogram(
+            lo, hi, buckets, include_out_of_range=1, approx_ok=0)
+    else:
+        data = _sampleBand(band).ravel()
+        if data.dtype.kind == 'f':
+            data = data[np.isfinite(data)]
+        if nodata is not None:
+            data = data[data != nodata]
+        if data.size == 0:
+            lo = hi = 0.0
+            histogram = [0] * buckets
+        else:
+            lo, hi = float(data.min()), float(data.max())
+            histogram = np.histogram(
+                data, bins=buckets, range=(lo, hi if hi > lo else lo + 1))[0]
+            histogram = histogram.tolist()
+    lowValue, highValue = percentiles(histogram, lo, hi, low, high)
+    del band, ds
+    return dict(
+        min=lo,
+        max=hi,
+        low=lowValue,
+        high=highValue,
+        histogram=list(histogram),
+    )
+
+
+def computeStats(filename, bandCount, statsMode=None):
+    '''
+    statistics of every band of filename: min, max, the low/high
+    percentiles of the stretch and the histogram, in the given mode (the
+    module mode by default). the bands are computed in parallel.
+    '''
+    statsMode = statsMode or mode
+    workers = max(1, min(bandCount, os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_bandStats, filename, bandIdx, statsMode,
+                        lowPercent, highPercent)
+            for bandIdx in range(1, bandCount + 1)
+        ]
+        bands = [f.result() for f in futures]
+    return dict(mode=statsMode, lowPercent=lowPercent,
+                highPercent=highPercent, bands=bands)
+
+
+def writeOmd(omd, stats):
+    '''the stretch of stats in the .omd format the viewer reads.'''
+    def write(f):
+        # only the keys the viewer knows, the mode stays in the raster cache
+        f.write('number_bands:  {}\n\n'.format(len(stats['bands'])))
+        for bandIdx, band in enumerate(stats['bands'], 1):
+            f.write('band{}.min_value:  {}\n'.format(bandIdx, band['low']))
+            f.write('band{}.max_value:  {}\n'.format(bandIdx, band['high']))
+    writeAtomic(omd, write)
@@ -0,0 +1,76 @@
+import collections
+
+from PyQt5.QtCore import QMutex, QThread, QWaitCondition, pyqtSignal
+
+
+class SaveThread(QThread):
+    '''
+    writes label files off the GUI thread.
+
+    submit() queues a save function with its keyword arguments; a save
+    queued for a file that is still waiting replaces the older one, so
+    back-to-back saves of the same file end up as a single write. the
+    outcome of every write is reported with the token given to submit().
+    '''
+
+    saved = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str, object)
+
+    def __init__(self):
+        QThread.__init__(self)
+        self.mutex = QMutex()
+        self.wakeUp = QWaitCondition()
+        self.idle = QWaitCondition()
+        self.pending = collections.OrderedDict()
+        self.current = None
+        self.stopMe = 0
+
+    def submit(self, filename, save, kwargs, token=None):
+        self.mutex.lock()
+        self.pending[filename] = (save, kwargs, token)
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+
+    def isBusy(self, filename=None):
+        '''a save of filename (of any file if None) is queued or running.'''
+        if filename is None:
+            return bool(self.pending) or self.current is not None
+        return filename in self.pending or self.current == filename
+
+    def flush(self, filename=None):
+        '''block until the queued saves of filename (or all) were written.'''
+        self.mutex.lock()
+        while self.isBusy(filename):
+            self.idle.wait(self.mutex)
+        self.mutex.unlock()
+
+    def run(self):
+        while True:
+            self.mutex.lock()
+            while not self.pending and not self.stopMe:
+                self.wakeUp.wait(self.mutex)
+            if not self.pending:
+                self.mutex.unlock()
+                return
+            filename, (save, kwargs, token) = self.pending.popitem(last=False)
+            self.current = filename
+            self.mutex.unlock()
+
+            try:
+                save(filename=filename, **kwargs)
+                self.saved.emit(filename, token)
+            except Exception as e:
+                self.failed.emit(filename, str(e), token)
+
+            self.mutex.lock()
+            self.current = None
+            self.idle.wakeAll()
+            self.mutex.unlock()
+
+    def stop(self):
+        '''write what is still queued, then end the thread.'''
+        self.mutex.lock()
+        self.stopMe = 1
+        self.wakeUp.wakeOne()
+        self.mutex.unlock()
+        QThread.wait(self)
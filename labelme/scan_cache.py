@@ -0,0 +1,88 @@
+import hashlib
+import os
+import os.path as osp
+
+from . import json_codec
+from . import logger
+from .label_file import writeAtomic
+
+
+class ScanCache(object):
+    '''
+    the directory snapshot of a DirWatcher, kept across sessions.
+
+    for every directory below root it holds the mtime, the subdirectories
+    and the images with their labeled state. when root is opened again the
+    cached listing fills the file list at once and the watcher only lists
+    the directories whose mtime moved since; unchanged subtrees are not
+    read at all.
+
+    the caches live outside the opened directories (writing into them
+    would move their mtime, and they may be read only), one file per root
+    in cacheDir().
+    '''
+
+    version = 2
+
+    def __init__(self, root, cachePath=None):
+        # the paths of the scan, see DirWatcher
+        self.root = root
+        if cachePath is None:
+            cachePath = osp.join(self.cacheDir(), '{}.json'.format(
+                hashlib.sha1(osp.normcase(osp.abspath(self.root))
+                             .encode('utf-8')).hexdigest()))
+        self.cachePath = cachePath
+
+    @staticmethod
+    def cacheDir():
+        return osp.join(osp.expanduser('~'), '.rslabel', 'scan_cache')
+
+    def _key(self, dirpath):
+        return osp.relpath(dirpath, self.root).replace('\\', '/')
+
+    def _path(self, key):
+        if key == '.':
+            return self.root
+        return osp.join(self.root, *key.split('/'))
+
+    def load(self):
+        '''the cached DirWatcher.dirs of root, None if there is none.'''
+        if not osp.exists(self.cachePath):
+            return None
+        try:
+            with open(self.cachePath, 'r') as f:
+                data = json_codec.load(f)
+            if data.get('version') != self.version or \
+                    osp.normpath(data.get('root', '')) != \
+                    osp.normpath(self.root):
+                return None
+            dirs = {}
+            for key, (mtime, subdirs, images) in data['dirs'].items():
+                dirs[self._path(key)] = (
+                    mtime,
+                    set(self._path(k) for k in subdirs),
+                    dict((name, labeled) for name, labeled in images))
+            return dirs
+        except Exception as e:
+            logger.warn('Ignoring broken scan cache {}: {}'
+                        .format(self.cachePath, e))
+            return None
+
+    def save(self, dirs):
+        '''write the DirWatcher.dirs of root.'''
+        entries = {}
+        for dirpath, (mtime, subdirs, images) in dirs.items():
+            entries[self._key(dirpath)] = [
+                mtime,
+                [self._key(d) for d in subdirs],
+                [[name, labeled] for name, labeled in images.items()],
+            ]
+        data = dict(version=self.version, root=self.root, dirs=entries)
+        try:
+            if not osp.exists(osp.dirname(self.cachePath)):
+                os.makedirs(osp.dirname(self.cachePath))
+            writeAtomic(self.cachePath,
+                        lambda f: json_codec.dump(data, f))
+        except Exception as e:
+            logger.warn('Failed to save scan cache {}: {}'
+                        .format(self.cachePath, e))
@@ -67,6 +67,19 @@ except Exception:
 
 from .utils import AttrDict
 
+try:
+    # one dataset per worker for all its tiles, not one per tile
+    from labelme.gdal_pool import openDataset
+except ImportError:
+    def openDataset(path):
+        return gdal.Open(path, gdal.GA_ReadOnly)
+
+try:
+    from labelme.gdal_profile import warpMemoryLimit
+except ImportError:
+    def warpMemoryLimit():
+        return None
+
 
 resampling_list = ('average', 'near', 'bilinear', 'cubic', 'cubicspline', 'lanczos', 'antialias')
 profile_list = ('mercator', 'geodetic', 'raster')
@@ -764,6 +777,7 @@ def reproject_dataset(from_dataset, from_srs, to_srs, options=None):
     if (from_srs.ExportToProj4() != to_srs.ExportToProj4()) or (from_dataset.GetGCPCount() != 0):
         to_dataset = gdal.AutoCreateWarpedVRT(from_dataset,
                                               from_srs.ExportToWkt(), to_srs.ExportToWkt())
+        to_dataset = update_warp_memory_limit(to_dataset, warpMemoryLimit())
 
         if options and options.verbose:
             print("Warping of the raster by AutoCreateWarpedVRT (result saved into 'tiles.vrt')")
@@ -795,6 +809,24 @@ def add_gdal_warp_options_to_string(vrt_string, warp_options):
     return ElementTree.tostring(vrt_root).decode()
 
 
+def update_warp_memory_limit(warped_vrt_dataset, limit):
+    """
+    Sets the WarpMemoryLimit (bytes) of the WarpedVRT dataset passed, from the
+    gdal profile of the tiling job
+    """
+    if not limit:
+        return warped_vrt_dataset
+    vrt_root = ElementTree.fromstring(warped_vrt_dataset.GetMetadata("xml:VRT")[0])
+    options = vrt_root.find(".//GDALWarpOptions")
+    if options is None:
+        return warped_vrt_dataset
+    elem = options.find("WarpMemoryLimit")
+    if elem is None:
+        elem = ElementTree.SubElement(options, "WarpMemoryLimit")
+    elem.text = str(limit)
+    return gdal.Open(ElementTree.tostring(vrt_root).decode())
+
+
 def update_no_data_values(warped_vrt_dataset, nodata_values, options=None):
     """
     Takes an array of NODATA values and forces them on the WarpedVRT file dataset passed
@@ -960,7 +992,7 @@ def create_base_tile(tile_job_info, tile_detail, queue=None):
     options = tile_job_info.options
 
     tilebands = dataBandsCount + 1
-    ds = gdal.Open(tile_job_info.src_file, gdal.GA_ReadOnly)
+    ds = openDataset(tile_job_info.src_file)
     mem_drv = gdal.GetDriverByName('MEM')
     out_drv = gdal.GetDriverByName(tile_job_info.tile_driver)
     alphaband = ds.GetRasterBand(1).GetMaskBand()
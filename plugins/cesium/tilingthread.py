@@ -31,6 +31,14 @@ import time
 from PyQt5.QtCore import QThread, QMutex, pyqtSignal
 from .gdal2tiles import *
 
+try:
+    from labelme.gdal_profile import gdalProfile
+except ImportError:
+    import contextlib
+
+    def gdalProfile(name):
+        return contextlib.suppress()
+
 
 class TilingThread(QThread):
     rangeChanged = pyqtSignal(str, int)
@@ -56,8 +64,12 @@ class TilingThread(QThread):
         #  generate a list of tiles.
         self.rangeChanged.emit(self.tr('切片...'), 100)
         try:
-            self.swne = generate_tiles(
-                self, self.filename, self.outdir, resume=True)
+            # the tiling preset of the gdal config, also for the worker
+            # processes of gdal2tiles; gdalProfile keeps it consistent with
+            # an export running on the gui thread at the same time
+            with gdalProfile('tiling'):
+                self.swne = generate_tiles(
+                    self, self.filename, self.outdir, resume=True)
         except:
             self.noSrs.emit()
         if(self.swne is None):